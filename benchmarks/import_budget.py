@@ -0,0 +1,93 @@
+"""Check the cold-start import time of portfolio.py, and that the Profile page does not load the heavy modules.
+
+Usage, from the repository root:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget 1.0 --runs 7
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Measured at about 0.55 s on a small cloud instance, against about 2.8 s when the exploration page was
+# imported at start-up as well
+IMPORT_BUDGET_SECONDS = 1.5
+
+# Only the exploration page needs these, they must be imported when it is first selected
+HEAVY_MODULES = ["pandas", "pyarrow", "matplotlib", "seaborn", "geopandas", "shapely", "folium", "duckdb",
+                 "data_handling_and_plots", "streamlit_pages.exploration_page"]
+
+TIMING_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def startup_imports(path: str = os.path.join(REPO_DIR, "portfolio.py")) -> list[str]:
+    """The import statements that portfolio.py runs at module level, whatever page is selected."""
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def time_imports(imports: list[str]) -> dict:
+    # A fresh interpreter each time, so that nothing is already imported
+    script = TIMING_SCRIPT.format(imports="\n".join(imports), heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPO_DIR, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(imports: list[str], count: int = 10) -> list[tuple[str, float]]:
+    # -X importtime prints "import time: self [us] | cumulative | imported package" for every module
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(imports)], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+            timings.append((parts[2].rstrip(), int(parts[1]) / 1e6))
+    # Top-level packages only (no leading spaces), the nested ones are part of their cumulative time, and
+    # without the standard library modules that the interpreter loads at start-up anyway
+    top_level = [(name.strip(), seconds) for name, seconds in timings
+                 if not name.startswith("  ") and name.strip().split(".")[0] not in sys.stdlib_module_names]
+    return sorted(top_level, key=lambda timing: timing[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="maximum median import time in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = startup_imports()
+    runs = [time_imports(imports) for _ in range(args.runs)]
+    median = statistics.median(run["seconds"] for run in runs)
+    loaded = sorted({name for run in runs for name in run["modules"]})
+
+    print(f"Start-up imports of portfolio.py: {median * 1000:.0f} ms (median of {args.runs}, "
+          f"budget {args.budget * 1000:.0f} ms)")
+    for name, seconds in slowest_imports(imports):
+        print(f"  {name:<40} {seconds * 1000:>8.1f} ms")
+
+    failures = []
+    if median > args.budget:
+        failures.append(f"import time {median:.3f} s is over the budget of {args.budget:.3f} s")
+    if loaded:
+        failures.append(f"heavy modules imported at start-up: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
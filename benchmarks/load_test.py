@@ -0,0 +1,319 @@
+"""Drive simultaneous sessions of portfolio.py on a local server and report rerun latency, throughput and memory.
+
+A Streamlit server is started on the side, with the department map source replaced by local placeholder
+shapes, and every simulated session talks to it over its own websocket like a browser tab does. Sessions
+randomly switch pages, move the distribution sliders and pick the school views of the Talma case study, and
+download the images of each run. The latency of a rerun is the time from the widget change to the end of the
+script run (of the fragment for the widgets of a fragment). The RSS of the server process is sampled
+throughout.
+
+Usage, from the repository root:
+    python -m benchmarks.load_test --sessions 8 --duration 60
+    python -m benchmarks.load_test --sessions 20 --duration 120 --scale 10 --output load_results.json
+    python -m benchmarks.load_test --sessions 8 --dataset fr-en-indicateurs-de-resultat-des-lycees-gt_v2.csv
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import psutil
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+from benchmarks.run_benchmarks import REPO_DIR, PAGE_TIMEOUT, git_commit, stub_department_geometry
+from benchmarks.synthetic_data import write_dataset
+
+PAGES = ["Profile", "High schools Added Value"]
+# Labels of the widgets the sessions use
+PAGE_LABEL = "Move to:"
+SLIDER_LABEL = "Select the year"
+SCHOOL_VIEW_LABEL = "Select which plot to display:"
+# Relative weights of the actions a session picks from, when they are on the page it is on
+ACTION_WEIGHTS = {"navigate": 1, "distribution_slider": 3, "school_view": 2}
+PERCENTILES = [50, 95, 99]
+SERVER_START_TIMEOUT = 120
+# The department map alone is a few MB with the real geometry
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+
+class Session:
+    """One simulated browser tab: the widgets of its last run, the values it set and the latency of its reruns."""
+
+    def __init__(self, number: int, seed: int, url: str):
+        self.number = number
+        self.random = random.Random(seed * 1000 + number)
+        self.url = url
+        self.page = PAGES[0]
+        # Widgets shown by the last run, by id: (label, widget proto, fragment id)
+        self.widgets: dict[str, tuple] = {}
+        # Values set so far, sent with every rerun like the browser does
+        self.states: dict[str, WidgetState] = {}
+        self.reruns: list[dict] = []
+        self.socket = None
+
+    async def connect(self):
+        self.socket = await websocket_connect(self.url.replace("http", "ws", 1) + "/_stcore/stream",
+                                              max_message_size=MAX_MESSAGE_SIZE)
+
+    def find(self, label: str) -> list[tuple]:
+        return [(widget_id, widget, fragment_id) for widget_id, (widget_label, widget, fragment_id)
+                in self.widgets.items() if widget_label == label]
+
+    async def rerun(self, action: str, fragment_id: str = ""):
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        message.rerun_script.fragment_id = fragment_id
+        if not fragment_id:
+            self.widgets = {}
+
+        start = time.perf_counter()
+        error, images = None, []
+        try:
+            await self.socket.write_message(message.SerializeToString(), binary=True)
+            while True:
+                data = await asyncio.wait_for(self.socket.read_message(), PAGE_TIMEOUT)
+                if data is None:
+                    raise ConnectionError("the server closed the websocket")
+                forward = ForwardMsg()
+                forward.ParseFromString(data)
+                if forward.WhichOneof("type") == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                    element = forward.delta.new_element
+                    kind = element.WhichOneof("type")
+                    if kind in ("slider", "radio"):
+                        widget = getattr(element, kind)
+                        self.widgets[widget.id] = (widget.label, widget, forward.delta.fragment_id)
+                    elif kind == "imgs":
+                        images += [image.url for image in element.imgs.imgs]
+                    elif kind == "exception" and not element.exception.is_warning:
+                        error = f"{element.exception.type}: {element.exception.message}"
+                elif forward.WhichOneof("type") == "script_finished":
+                    if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                        error = "compile error"
+                    if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                        break
+        except Exception as exception:  # A timeout counts as a failed rerun, the session carries on
+            error = repr(exception)
+        seconds = time.perf_counter() - start
+
+        # Like a browser, the images are downloaded once the run sent them
+        responses = await asyncio.gather(*[AsyncHTTPClient().fetch(self.url + url, raise_error=False)
+                                           for url in images if url.startswith("/")])
+        self.reruns.append({"session": self.number, "action": action, "start": start, "seconds": seconds,
+                            "error": error, "images": len(responses),
+                            "image_bytes": sum(len(response.body or b"") for response in responses)})
+
+    def actions(self) -> list[str]:
+        available = ["navigate"]
+        if self.page == PAGES[1]:
+            if self.find(SLIDER_LABEL):
+                available.append("distribution_slider")
+            if self.find(SCHOOL_VIEW_LABEL):
+                available.append("school_view")
+        return available
+
+    def select_page(self, page: str) -> str:
+        widget_id, radio, fragment_id = self.find(PAGE_LABEL)[0]
+        self.page = page
+        self.states[widget_id] = WidgetState(id=widget_id, int_value=list(radio.options).index(page))
+        return fragment_id
+
+    async def step(self):
+        available = self.actions()
+        action = self.random.choices(available, [ACTION_WEIGHTS[name] for name in available])[0]
+        if action == "navigate":
+            fragment_id = self.select_page(PAGES[1] if self.page == PAGES[0] else PAGES[0])
+        elif action == "distribution_slider":
+            widget_id, slider, fragment_id = self.random.choice(self.find(SLIDER_LABEL))
+            state = WidgetState(id=widget_id)
+            state.double_array_value.data.append(self.random.randint(int(slider.min), int(slider.max)))
+            self.states[widget_id] = state
+        else:
+            widget_id, radio, fragment_id = self.find(SCHOOL_VIEW_LABEL)[0]
+            current = self.states[widget_id].int_value if widget_id in self.states else radio.default
+            choice = self.random.choice([index for index in range(len(radio.options)) if index != current])
+            self.states[widget_id] = WidgetState(id=widget_id, int_value=choice)
+        await self.rerun(action, fragment_id)
+
+    async def run(self, deadline: float):
+        await self.rerun("first load")
+        while time.perf_counter() < deadline:
+            await self.step()
+        self.socket.close()
+
+
+async def sample_memory(samples: list[dict], sessions: list[Session], process: psutil.Process, start: float,
+                        interval: float):
+    while True:
+        rss = process.memory_info().rss + sum(child.memory_info().rss for child in process.children(recursive=True))
+        samples.append({"seconds": round(time.perf_counter() - start, 3), "rss_mb": round(rss / 2 ** 20, 1),
+                        "reruns": sum(len(session.reruns) for session in sessions)})
+        await asyncio.sleep(interval)
+
+
+def latency_summary(reruns: list[dict]) -> dict:
+    seconds = np.array([rerun["seconds"] for rerun in reruns])
+    summary = {"reruns": len(reruns), "errors": sum(rerun["error"] is not None for rerun in reruns)}
+    if len(seconds):
+        summary.update({f"p{percentile}_seconds": float(np.percentile(seconds, percentile))
+                        for percentile in PERCENTILES})
+        summary["max_seconds"] = float(seconds.max())
+    return summary
+
+
+async def warm_up(url: str) -> float:
+    # One untimed visit of both pages: the first Profile run starts the background preload of the exploration
+    # data and the exploration page waits for it, so the timed sessions do not run alongside it
+    session = Session(-1, 0, url)
+    await session.connect()
+    start = time.perf_counter()
+    await session.rerun("first load")
+    await session.rerun("navigate", session.select_page(PAGES[1]))
+    session.socket.close()
+    errors = [rerun["error"] for rerun in session.reruns if rerun["error"] is not None]
+    if errors:
+        raise RuntimeError(f"The warm-up visit failed: {errors[0]}")
+    return time.perf_counter() - start
+
+
+async def load_test(url: str, server: psutil.Process, session_count: int, duration: float, seed: int,
+                    interval: float, cold: bool = False) -> dict:
+    warm_up_seconds = None if cold else await warm_up(url)
+    # All the sessions connect first, then start together and run until the same deadline
+    sessions = [Session(number, seed, url) for number in range(session_count)]
+    await asyncio.gather(*[session.connect() for session in sessions])
+    samples: list[dict] = []
+    start = time.perf_counter()
+    sampler = asyncio.create_task(sample_memory(samples, sessions, server, start, interval))
+    await asyncio.gather(*[session.run(start + duration) for session in sessions])
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+
+    reruns = [rerun for session in sessions for rerun in session.reruns]
+    # The first loads include the cold caches, they are reported on their own
+    steady = [rerun for rerun in reruns if rerun["action"] != "first load"]
+    actions = sorted({rerun["action"] for rerun in reruns})
+    return {
+        "sessions": session_count,
+        "duration_seconds": elapsed,
+        "warm_up_seconds": warm_up_seconds,
+        "throughput_reruns_per_second": len(reruns) / elapsed,
+        "image_bytes": sum(rerun["image_bytes"] for rerun in reruns),
+        "latency": latency_summary(steady),
+        "latency_by_action": {action: latency_summary([rerun for rerun in reruns if rerun["action"] == action])
+                              for action in actions},
+        "rss_mb": {"start": samples[0]["rss_mb"], "peak": max(sample["rss_mb"] for sample in samples),
+                   "end": samples[-1]["rss_mb"]},
+        "rss_timeline": samples,
+        "errors": sorted({str(rerun["error"]) for rerun in reruns if rerun["error"] is not None}),
+    }
+
+
+def serve(directory: str, port: int):
+    """Run the app in this process, with the map source stubbed before the script first imports it."""
+    from streamlit.web import bootstrap
+
+    stub_department_geometry(directory)
+    # Same keys as the flags of "streamlit run"
+    flag_options = {"server_port": port, "server_headless": True, "server_fileWatcherType": "none",
+                    "browser_gatherUsageStats": False}
+    bootstrap.load_config_options(flag_options)
+    bootstrap.run(os.path.join(REPO_DIR, "portfolio.py"), False, [], flag_options)
+
+
+def start_server(directory: str, dataset: str) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # Every cache starts empty in the temporary directory, like a freshly deployed server
+    environment = dict(os.environ, DATASET_PATH=dataset, CACHE_DIR=os.path.join(directory, "cache"))
+    log = open(os.path.join(directory, "server.log"), "w")
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.load_test", "--serve", directory,
+                               "--port", str(port)], cwd=REPO_DIR, env=environment, stdout=log, stderr=log)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with status {server.returncode}, see {log.name}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as response:
+                if response.read() == b"ok":
+                    return server, url
+        except OSError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError(f"The server did not start within {SERVER_START_TIMEOUT} s")
+
+
+def print_report(report: dict):
+    if report["warm_up_seconds"] is not None:
+        print(f"Warm-up visit (data loading and preload): {report['warm_up_seconds']:.1f} s")
+    print(f"{report['sessions']} sessions for {report['duration_seconds']:.1f} s: "
+          f"{report['throughput_reruns_per_second']:.2f} reruns/s, "
+          f"{report['image_bytes'] / 2 ** 20:.1f} MB of images downloaded")
+    print(f"{'action':<22} {'reruns':>7} {'errors':>7}" + "".join(f" {f'p{p} ms':>10}" for p in PERCENTILES))
+    for action, summary in [("all but first loads", report["latency"])] + list(report["latency_by_action"].items()):
+        percentiles = "".join(f" {summary.get(f'p{p}_seconds', float('nan')) * 1000:>10.1f}" for p in PERCENTILES)
+        print(f"{action:<22} {summary['reruns']:>7} {summary['errors']:>7}{percentiles}")
+    rss = report["rss_mb"]
+    print(f"Server RSS: {rss['start']:.0f} MB at start, {rss['peak']:.0f} MB at peak, {rss['end']:.0f} MB at the end")
+    for error in report["errors"]:
+        print(f"ERROR {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="number of simultaneous sessions")
+    parser.add_argument("--duration", type=float, default=60, help="seconds during which the sessions act")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="size of the synthetic dataset, as a multiple of the real dataset")
+    parser.add_argument("--dataset", help="CSV to serve instead of a synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", type=float, default=1, help="seconds between two RSS samples")
+    parser.add_argument("--output", default="load_results.json")
+    parser.add_argument("--cold", action="store_true",
+                        help="start the sessions on a cold server, without the warm-up visit")
+    parser.add_argument("--serve", metavar="DIRECTORY", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        serve(arguments.serve, arguments.port)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        dataset = os.path.abspath(arguments.dataset) if arguments.dataset else os.path.join(directory, "lycees.csv")
+        if not arguments.dataset:
+            write_dataset(dataset, arguments.scale)
+        server, url = start_server(directory, dataset)
+        try:
+            report = asyncio.run(load_test(url, psutil.Process(server.pid), arguments.sessions, arguments.duration,
+                                           arguments.seed, arguments.interval, arguments.cold))
+        finally:
+            server.terminate()
+            server.wait()
+
+    report.update({"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": git_commit(),
+                   "python": platform.python_version(), "platform": platform.platform(),
+                   "cpu_count": os.cpu_count(), "dataset": arguments.dataset or f"synthetic x{arguments.scale:g}"})
+    print_report(report)
+    with open(arguments.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
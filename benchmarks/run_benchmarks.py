@@ -0,0 +1,266 @@
+"""Time the data pipeline, every chart builder and full page renders on synthetic datasets.
+
+Usage, from the repository root:
+    python -m benchmarks.run_benchmarks --scales 1 10 100 --output bench_results.json
+    python -m benchmarks.run_benchmarks --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import data_handling_and_plots
+import department_geometry
+import duckdb_backend
+import figure_cache
+import preload
+import skill_wordclouds
+from benchmarks.synthetic_data import DEPARTMENTS, write_dataset
+from data_handling_and_plots import *
+
+# Charts of the exploration page, with the arguments it uses
+SUCCESS_RATE = "Taux de reussite - Toutes series"
+ADDED_VALUE = "Valeur ajoutee du taux de reussite - Toutes series"
+HONOURS_G = ["Nombre de mentions TB avec felicitations - G", "Nombre de mentions TB sans felicitations - G",
+             "Nombre de mentions B - G", "Nombre de mentions AB - G"]
+ADDED_VALUES = [ADDED_VALUE, "Valeur ajoutee du taux de mentions - Toutes series"]
+# Queries the charts make on the aggregate cube, as (columns, by, year)
+CUBE_QUERIES = [(SUCCESS_RATE, ["Annee"], None), (ADDED_VALUE, ["Annee", "Secteur"], None), (HONOURS_G, None, 2023)]
+CUBE_QUERIES += [(column, ["Code departement"], 2023) for column in ADDED_VALUES]
+PAGE_TIMEOUT = 900
+
+
+def measure(function: Callable, repeats: int) -> list[float]:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def stub_department_geometry(directory: str):
+    # A grid of squares stands in for the departments so that no map build reaches the network
+    squares = [shapely.box(i % 10, i // 10, i % 10 + 1, i // 10 + 1) for i in range(len(DEPARTMENTS))]
+    departments = gpd.GeoDataFrame({"code": DEPARTMENTS, "nom": DEPARTMENTS}, geometry=squares, crs="EPSG:4326")
+    source = os.path.join(directory, "departements.geojson")
+    departments.to_file(source, driver="GeoJSON")
+
+    department_geometry.GEOMETRY_DIR = os.path.join(directory, "geometry")
+    department_geometry.build_department_geometry(source)
+    department_geometry.load_department_geometry.cache_clear()
+
+
+def render_chart(builder: Callable, data, args: tuple):
+    chart = builder(data, *args)
+    if hasattr(chart, "get_root"):
+        # Folium maps are timed up to their HTML, which is what gets sent to the browser
+        return chart.get_root().render()
+    return figure_cache.figure_to_bytes(chart)
+
+
+def clear_caches():
+    # A background preload still running would fill the caches again, and a finished one would never run again
+    preload.reset()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    figure_cache.FIGURE_CACHE.clear()
+    skill_wordclouds._cached_wordcloud.cache_clear()
+
+
+def exploration_script():
+    from streamlit_pages import exploration_page
+    exploration_page.show_data_exploration()
+
+
+def time_app(app: AppTest, repeats: int, page: str = None) -> tuple[float, list[float]]:
+    """Time the first (cold) run of the app, then its reruns with warm caches."""
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"The app raised: {app.exception[0].value}")
+
+    clear_caches()
+    if page is not None:
+        run()
+        app.sidebar.radio[0].set_value(page)
+        clear_caches()
+    cold = measure(run, 1)[0]
+    # The first run starts the background preload of the exploration data, the warm reruns are timed without it
+    preload.wait()
+    return cold, measure(run, repeats)
+
+
+def compare_query_backends(cube: AggregateCube) -> list[str]:
+    """Queries of the charts for which QUERY_BACKEND=duckdb does not give exactly the means of the cube."""
+    duckdb_cube = duckdb_backend.build_duckdb_cube()
+    mismatches = []
+    for columns, by, year in CUBE_QUERIES:
+        expected, result = cube.mean(columns, by=by, year=year), duckdb_cube.mean(columns, by=by, year=year)
+        try:
+            if by:
+                # Same values, but the cube keeps the compact int16 of 'Annee' where DuckDB returns int64
+                pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=True)
+            else:
+                pd.testing.assert_series_equal(result, expected, check_exact=True)
+        except AssertionError as error:
+            mismatches.append(f"mean({columns!r}, by={by}, year={year}): {error}")
+    return mismatches
+
+
+def time_preload() -> float:
+    clear_caches()
+    start = time.perf_counter()
+    preload.start()
+    if not preload.wait():
+        raise RuntimeError("The background preload of the exploration data failed")
+    return time.perf_counter() - start
+
+
+def benchmark_scale(scale: float, directory: str, repeats: int) -> list[dict]:
+    csv_path = os.path.join(directory, f"lycees_x{scale:g}.csv")
+    rows = write_dataset(csv_path, scale)
+    data_handling_and_plots.DATASET_PATH = csv_path
+    data_handling_and_plots.CACHE_DIR = os.path.join(directory, f"cache_x{scale:g}")
+    skill_wordclouds.WORDCLOUD_DIR = os.path.join(directory, f"wordclouds_x{scale:g}")
+
+    results = []
+
+    def record(name: str, durations: list[float]):
+        results.append({"scale": scale, "rows": rows, "name": name, "repeats": len(durations),
+                        "median_seconds": statistics.median(durations), "min_seconds": min(durations)})
+        print(f"x{scale:<5g} {name:<55} {statistics.median(durations) * 1000:>10.1f} ms")
+
+    # The first load parses the CSV and writes the Parquet cache, the next ones only read it
+    record("load_dataset (cold)", measure(load_dataset, 1))
+    record("load_dataset (warm)", measure(load_dataset, repeats))
+    raw = load_dataset()
+    record("data_preprocessing", measure(lambda: data_preprocessing(raw), repeats))
+    data = data_preprocessing(raw)
+
+    record("build_aggregate_cube", measure(lambda: build_aggregate_cube(data), repeats))
+    record("build_school_index", measure(lambda: build_school_index(data), repeats))
+    record("build_distribution_tables",
+           measure(lambda: build_distribution_tables(data, [SUCCESS_RATE, ADDED_VALUE]), repeats))
+    cube = build_aggregate_cube(data)
+    schools = build_school_index(data)
+    distributions = build_distribution_tables(data, [SUCCESS_RATE, ADDED_VALUE])
+
+    if duckdb_backend.duckdb is None:
+        print(f"x{scale:<5g} duckdb is not installed, the query backends are not compared")
+    else:
+        mismatches = compare_query_backends(cube)
+        if mismatches:
+            raise RuntimeError("QUERY_BACKEND=duckdb does not match the pandas cube:\n" + "\n".join(mismatches))
+
+    charts = [
+        (create_distribution_plot, distributions, (SUCCESS_RATE, 2020)),
+        (create_distribution_overlay_plot, distributions, (SUCCESS_RATE,)),
+        (create_trend_plot, cube, (SUCCESS_RATE,)),
+        (create_box_plot_type, cube, (ADDED_VALUE,)),
+        (create_pie_chart_2023, cube, (HONOURS_G,)),
+        (create_department_map, cube, (ADDED_VALUES,)),
+        (create_trends_rates_school, schools, (TALMA_UAI, [SUCCESS_RATE, "Taux de mentions - Toutes series"])),
+        (create_trends_added_values_school, schools, (TALMA_UAI, [ADDED_VALUE])),
+        (create_trend_number_students_school, schools, (TALMA_UAI, "Presents - Toutes series")),
+    ]
+    for builder, chart_data, args in charts:
+        record(builder.__name__, measure(lambda: render_chart(builder, chart_data, args), repeats))
+
+    # What the first Profile run starts in the background: data loading and the first charts of the page
+    record("preload (cold)", [time_preload()])
+
+    portfolio_path = os.path.join(REPO_DIR, "portfolio.py")
+    for name, app, page in [
+        ("portfolio.py (Profile)", AppTest.from_file(portfolio_path, default_timeout=PAGE_TIMEOUT), None),
+        ("portfolio.py (High schools Added Value)", AppTest.from_file(portfolio_path, default_timeout=PAGE_TIMEOUT),
+         "High schools Added Value"),
+        ("show_data_exploration", AppTest.from_function(exploration_script, default_timeout=PAGE_TIMEOUT), None),
+    ]:
+        cold, warm = time_app(app, repeats, page)
+        record(f"{name} (cold)", [cold])
+        record(f"{name} (warm)", warm)
+
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as file:
+        baseline = {(entry["scale"], entry["name"]): entry for entry in json.load(file)["results"]}
+
+    regressions = []
+    for entry in results:
+        previous = baseline.get((entry["scale"], entry["name"]))
+        if previous is None or previous["median_seconds"] == 0:
+            continue
+        ratio = entry["median_seconds"] / previous["median_seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"x{entry['scale']:g} {entry['name']}: {previous['median_seconds'] * 1000:.1f} ms"
+                               f" -> {entry['median_seconds'] * 1000:.1f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard on synthetic datasets.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                        help="dataset sizes, as multiples of the real dataset")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown ratio above which a benchmark counts as a regression")
+    arguments = parser.parse_args()
+
+    # The app reads its images relative to the repository root
+    os.chdir(REPO_DIR)
+    with tempfile.TemporaryDirectory() as directory:
+        stub_department_geometry(directory)
+        results = []
+        for scale in arguments.scales:
+            results += benchmark_scale(scale, directory, arguments.repeats)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(arguments.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {arguments.output}")
+
+    if arguments.compare:
+        regressions = compare(results, arguments.compare, arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import numpy as np
+from pandas import DataFrame
+from data_handling_and_plots import COLUMNS_TO_KEEP, METRIC_COLUMNS, TALMA_UAI
+
+
+# Size of the real GT dataset: about 2,300 high schools over the years 2013 to 2023
+REAL_SCHOOL_COUNT = 2300
+YEARS = list(range(2013, 2024))
+HONOURS_FIRST_YEAR = 2017
+
+DEPARTMENTS = [f"{number:02d}" for number in range(1, 96) if number != 20] + ["2A", "2B", "971", "972", "973", "974", "976"]
+SECTORS = ["public", "privé sous contrat"]
+
+
+def generate_dataset(scale: float = 1, seed: int = 0) -> DataFrame:
+    """Synthetic dataset with the columns of COLUMNS_TO_KEEP (plus one unused column) for scale x the real size."""
+    rng = np.random.default_rng(seed)
+    school_count = max(1, int(REAL_SCHOOL_COUNT * scale))
+
+    # Static attributes of every school
+    uai = np.char.add(np.char.zfill(np.arange(school_count).astype(str), 7),
+                      np.array(list("ABCDEFGHJKLMNPRSTUVWXYZ"))[np.arange(school_count) % 23])
+    uai[0] = TALMA_UAI
+    department = rng.choice(DEPARTMENTS, school_count)
+    department[0] = "91"
+    sector = rng.choice(SECTORS, school_count, p=[0.6, 0.4])
+    region_code = rng.integers(11, 95, len(DEPARTMENTS))[np.searchsorted(sorted(DEPARTMENTS), department)]
+    academy = np.char.add("Academie ", department.astype(str))
+
+    # One row per school and year
+    row_count = school_count * len(YEARS)
+    school = np.tile(np.arange(school_count), len(YEARS))
+    year = np.repeat(YEARS, school_count)
+    data = {
+        'Annee': year,
+        'UAI': uai[school],
+        'Etablissement': np.char.add("Lycee ", uai)[school],
+        'Secteur': sector[school],
+        'Code commune': np.char.add(department, "001")[school],
+        'Commune': np.char.add("Commune ", department)[school],
+        'Code departement': department[school],
+        'Departement': np.char.add("Departement ", department)[school],
+        'Academie': academy[school],
+        'Code region': region_code[school],
+        'Region': np.char.add("Region ", region_code.astype(str))[school],
+        'Presents - Toutes series': rng.integers(20, 450, row_count).astype(float),
+        'Taux de reussite - Toutes series': np.clip(rng.normal(92, 5, row_count), 40, 100).round(),
+        'Valeur ajoutee du taux de reussite - Toutes series': rng.normal(0, 4, row_count).round(),
+        'Valeur ajoutee du taux d\'acces 2nde-bac': rng.normal(0, 6, row_count).round(),
+        'Taux de mentions - Toutes series': np.clip(rng.normal(55, 12, row_count), 0, 100).round(),
+        'Valeur ajoutee du taux de mentions - Toutes series': rng.normal(0, 6, row_count).round(),
+    }
+    for column in METRIC_COLUMNS:
+        if column.startswith('Nombre de mentions'):
+            data[column] = rng.integers(0, 80, row_count).astype(float)
+    data['Colonne non utilisee'] = rng.normal(size=row_count)
+
+    dataset = DataFrame(data)[COLUMNS_TO_KEEP + ['Colonne non utilisee']]
+
+    # Like in the real data, honours only exist from 2017 and a few values are missing
+    honours = [column for column in METRIC_COLUMNS if 'mentions' in column]
+    dataset.loc[dataset['Annee'] < HONOURS_FIRST_YEAR, honours] = np.nan
+    missing = rng.random(row_count) < 0.02
+    dataset.loc[missing, 'Valeur ajoutee du taux de reussite - Toutes series'] = np.nan
+    return dataset
+
+
+def write_dataset(path: str, scale: float = 1, seed: int = 0) -> int:
+    dataset = generate_dataset(scale, seed)
+    dataset.to_csv(path, sep=";", index=False)
+    return len(dataset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic high school results CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real dataset size")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    print(f"{write_dataset(arguments.path, arguments.scale, arguments.seed)} rows written to {arguments.path}")
@@ -0,0 +1,47 @@
+import hashlib
+import os
+from typing import Iterator
+import pandas as pd
+from pandas import DataFrame
+from data_handling_and_plots import (COLUMNS_TO_KEEP, STRING_COLUMNS, AggregateCube, build_aggregate_cube,
+                                     data_preprocessing, dataset_fingerprint)
+from instrumentation import instrumented
+
+# Several CSV files (for example the GT results, the vocational results and older archives) separated by
+# os.pathsep. When set, the exploration page only keeps the aggregates of these files in memory.
+DATASET_SOURCES = [path for path in os.environ.get("DATASET_SOURCES", "").split(os.pathsep) if path]
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 100_000))
+
+
+def sources_fingerprint(paths: list[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(dataset_fingerprint(path).encode())
+    return digest.hexdigest()
+
+
+def read_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[DataFrame]:
+    chunks = pd.read_csv(path, delimiter=";", usecols=lambda column: column in COLUMNS_TO_KEEP,
+                         dtype=STRING_COLUMNS, chunksize=chunk_size)
+    for chunk in chunks:
+        # Files that lack some of the columns (older archives) get them as missing values
+        yield data_preprocessing(chunk.reindex(columns=COLUMNS_TO_KEEP))
+
+
+@instrumented
+def stream_aggregate_cube(paths: list[str], chunk_size: int = CHUNK_SIZE) -> AggregateCube:
+    """Aggregate cube of all the files, read chunk by chunk so that memory depends on the chunk size only."""
+    table = None
+    for path in paths:
+        for chunk in read_chunks(path, chunk_size):
+            # Sums and counts of the chunk are folded into the running totals, then the chunk is dropped. Keys are
+            # aligned by grouping without sorting: missing keys can't be ordered against the others.
+            chunk_table = build_aggregate_cube(chunk).table
+            if table is not None:
+                chunk_table = pd.concat([table, chunk_table]).groupby(
+                    level=list(range(chunk_table.index.nlevels)), sort=False, dropna=False).sum()
+            table = chunk_table
+
+    if table is None:
+        return build_aggregate_cube(DataFrame(columns=COLUMNS_TO_KEEP))
+    return AggregateCube(table.sort_index())
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from pandas import DataFrame
+from data_handling_and_plots import (AggregateCube, DistributionTable, SchoolIndex, build_distribution_table,
+                                     column_options)
+from instrumentation import instrumented
+
+# Areas and sector the whole exploration page can be narrowed to, on top of a range of years
+AREA_COLUMNS = ['Region', 'Academie', 'Departement']
+FILTER_DIMENSIONS = AREA_COLUMNS + ['Secteur']
+# Filtered views kept per filter index, the national one is the snapshot itself
+FILTERED_VIEWS = 16
+
+
+def selection_key(selection: dict[str, list]) -> tuple:
+    # Same key whatever the order in which the values were picked, and without the unused filters
+    return tuple((column, tuple(sorted(values))) for column, values in sorted(selection.items()) if values)
+
+
+def scoped_version(data_version: str, selection: dict[str, list]) -> str:
+    """Version standing for the filtered data in the figure keys, the data version itself when unfiltered."""
+    key = selection_key(selection)
+    if not key:
+        return data_version
+    return f"{data_version}-{hashlib.sha256(repr(key).encode()).hexdigest()[:16]}"
+
+
+class CategoryBitmaps:
+    """One packed bitmap of rows per value of each column, so that filters resolve with bitwise ORs and ANDs."""
+
+    def __init__(self, frame: DataFrame, columns: list[str]):
+        self.size = len(frame)
+        self.bitmaps: dict[str, dict] = {}
+        for column in columns:
+            self.bitmaps[column] = {}
+            for value, rows in frame[column].groupby(frame[column], observed=True).indices.items():
+                bitmap = np.zeros(self.size, dtype=bool)
+                bitmap[rows] = True
+                self.bitmaps[column][value] = np.packbits(bitmap)
+
+    def mask(self, selection: dict[str, list]) -> np.ndarray:
+        # Values of a column are ORed together, columns are ANDed, an empty list does not filter
+        mask = np.full(-(-self.size // 8), 0xFF, dtype=np.uint8)
+        for column, values in selection.items():
+            if values:
+                union = np.zeros_like(mask)
+                for value in values:
+                    if value in self.bitmaps[column]:
+                        union |= self.bitmaps[column][value]
+                mask &= union
+        return np.unpackbits(mask, count=self.size).astype(bool)
+
+
+class FilteredView:
+    """Cube, distributions and schools of the rows matching a selection, in the shapes the chart builders take."""
+
+    def __init__(self, version: str, rows: int, cube: AggregateCube, distributions: dict[str, DistributionTable],
+                 schools: SchoolIndex):
+        self.version = version
+        self.rows = rows
+        self.cube = cube
+        self.distributions = distributions
+        self.schools = schools
+
+
+class FilterIndex:
+    """Row bitmaps of the dataset, of the aggregate cube and of the school index of one version of the data.
+
+    A selection maps columns of FILTER_DIMENSIONS and 'Annee' to the values to keep. The cube is filtered on
+    its own (year, sector, department) rows, so the charts built on it cost the same whatever the filters.
+    """
+
+    def __init__(self, data_version: str, data: DataFrame, cube: AggregateCube, schools: SchoolIndex,
+                 distributions: dict[str, DistributionTable]):
+        self.data_version = data_version
+        self.data = data
+        self.cube = cube
+        self.schools = schools
+        self.distributions = distributions
+        columns = ['Annee'] + FILTER_DIMENSIONS
+        self.data_bitmaps = CategoryBitmaps(data, columns)
+        self.school_bitmaps = CategoryBitmaps(schools.data, columns)
+
+        # Cube rows are per department: their region and academy come from the rows of that department
+        areas = (data[['Code departement'] + AREA_COLUMNS].dropna(subset=['Code departement'])
+                 .drop_duplicates('Code departement').astype(object).set_index('Code departement'))
+        cube_keys = cube.table.index.to_frame(index=False)
+        for column in AREA_COLUMNS:
+            cube_keys[column] = cube_keys['Code departement'].map(areas[column])
+        self.cube_bitmaps = CategoryBitmaps(cube_keys, columns)
+
+        # Block of each row of the school index, to narrow the blocks down to the matching years
+        sizes = np.array([stop - start for start, stop in schools.blocks.values()], dtype=int)
+        self._school_uai = np.array(list(schools.blocks), dtype=object)
+        self._row_block = np.repeat(np.arange(len(sizes)), sizes)
+
+        self._views: OrderedDict[tuple, FilteredView] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def options(self, column: str) -> list:
+        return column_options(self.data[column])
+
+    def _distributions(self, selection: dict[str, list], mask: np.ndarray) -> dict[str, DistributionTable]:
+        if any(selection.get(column) for column in FILTER_DIMENSIONS):
+            rows = self.data[mask]
+            return {column: build_distribution_table(rows, column) for column in self.distributions}
+        # A range of years only drops rows of the yearly tables, nothing is recomputed
+        years = selection.get('Annee') or []
+        distributions = {}
+        for column, table in self.distributions.items():
+            rows = np.isin(table.years, years)
+            distributions[column] = DistributionTable(column, table.years[rows], table.edges[rows],
+                                                      table.counts[rows], table.kde_x[rows], table.kde_y[rows])
+        return distributions
+
+    def _schools(self, mask: np.ndarray) -> SchoolIndex:
+        # Rows of a school are sorted by year: the matching ones are a narrower block of the same frame, so row
+        # positions (and the ranking table built on them) stay valid
+        rows = np.flatnonzero(mask)
+        blocks = self._row_block[rows]
+        found, first = np.unique(blocks, return_index=True)
+        last = len(blocks) - 1 - np.unique(blocks[::-1], return_index=True)[1]
+        return SchoolIndex(self.schools.data, {uai: (int(rows[start]), int(rows[stop]) + 1) for uai, start, stop
+                                               in zip(self._school_uai[found], first, last)})
+
+    @instrumented
+    def view(self, selection: dict[str, list]) -> FilteredView:
+        key = selection_key(selection)
+        with self._lock:
+            if key in self._views:
+                self._views.move_to_end(key)
+                return self._views[key]
+
+        if not key:
+            view = FilteredView(self.data_version, len(self.data), self.cube, self.distributions, self.schools)
+        else:
+            mask = self.data_bitmaps.mask(selection)
+            cube = AggregateCube(self.cube.table[self.cube_bitmaps.mask(selection)])
+            schools = self._schools(self.school_bitmaps.mask(selection))
+            view = FilteredView(scoped_version(self.data_version, selection), int(mask.sum()), cube,
+                                self._distributions(selection, mask), schools)
+
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > FILTERED_VIEWS:
+                self._views.popitem(last=False)
+        return view
@@ -1,68 +1,391 @@
+import os
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
 import seaborn as sns
-# import numpy as np
-import geopandas as gpd
+import numpy as np
 import folium
-
-
-def load_dataset() -> DataFrame:
-    data: DataFrame = pd.read_csv("fr-en-indicateurs-de-resultat-des-lycees-gt_v2.csv", delimiter=";")
+import branca.colormap
+from branca.element import MacroElement
+from jinja2 import Template
+from department_geometry import load_department_geometry
+from file_utils import atomic_write, file_hash
+from instrumentation import instrumented, mark_cache
+
+
+DATASET_PATH = os.environ.get("DATASET_PATH", "fr-en-indicateurs-de-resultat-des-lycees-gt_v2.csv")
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+
+COLUMNS_TO_KEEP = [
+    'Annee', 'UAI', 'Etablissement', 'Secteur', 'Code commune', 'Commune',
+    'Code departement', 'Departement', 'Academie', 'Code region', 'Region',
+    'Presents - Toutes series', 'Taux de reussite - Toutes series',
+    'Valeur ajoutee du taux de reussite - Toutes series',
+    'Valeur ajoutee du taux d\'acces 2nde-bac', 'Taux de mentions - Toutes series',
+    'Valeur ajoutee du taux de mentions - Toutes series',
+    'Nombre de mentions TB avec felicitations - G', 'Nombre de mentions TB sans felicitations - G',
+    'Nombre de mentions B - G', 'Nombre de mentions AB - G',
+    'Nombre de mentions TB avec felicitations - T', 'Nombre de mentions TB sans felicitations - T',
+    'Nombre de mentions B - T', 'Nombre de mentions AB - T'
+]
+
+# Dimensions and numeric columns of the aggregate cube shared by the chart builders
+CUBE_KEYS = ['Annee', 'Secteur', 'Code departement']
+METRIC_COLUMNS = COLUMNS_TO_KEEP[COLUMNS_TO_KEEP.index('Presents - Toutes series'):]
+
+# Columns whose yearly distributions are shown with the sliders
+DISTRIBUTION_COLUMNS = ['Taux de reussite - Toutes series', 'Valeur ajoutee du taux de reussite - Toutes series']
+
+# Same histogram and KDE settings as sns.histplot(..., kde=True, bins=20)
+DISTRIBUTION_BINS = 20
+KDE_GRIDSIZE = 200
+# Number of rows whose kernels are evaluated at once when computing the KDE curves
+KDE_CHUNK_SIZE = 4096
+
+# Areas within which the high schools are ranked each year
+RANKING_SCOPES = ['Departement', 'Academie', 'Region', 'Secteur']
+
+# UAI of the Lycée Talma, the default school of the case study
+TALMA_UAI = '0911021R'
+
+# Identifiers like '0911021R' or '2A' must not be parsed as numbers
+STRING_COLUMNS = {'UAI': str, 'Code commune': str, 'Code departement': str}
+
+# Text columns with at most this share of distinct values are stored as categories (codes + one copy of each value)
+CATEGORY_MAX_RATIO = 0.5
+
+def dataset_fingerprint(path: str = None) -> str:
+    # Hashing the file is only needed when it changed on disk
+    return file_hash(path or DATASET_PATH)
+
+
+def parquet_cache(path: str = None) -> str:
+    path = path or DATASET_PATH
+    cache_path = os.path.join(CACHE_DIR, f"{dataset_fingerprint(path)}.parquet")
+
+    # The CSV is parsed once per version of the file, then only the needed columns are read
+    mark_cache(hit=os.path.exists(cache_path))
+    if not os.path.exists(cache_path):
+        data: DataFrame = pd.read_csv(path, delimiter=";", dtype=STRING_COLUMNS, low_memory=False)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with atomic_write(cache_path) as file:
+            data.to_parquet(file, index=False)
+
+    return cache_path
+
+
+@instrumented
+def load_dataset(path: str = None, columns: list[str] = COLUMNS_TO_KEEP) -> DataFrame:
+    data: DataFrame = pd.read_parquet(parquet_cache(path), columns=columns)
     return data
 
 
+def compact_dtypes(data: DataFrame) -> DataFrame:
+    """Same values in the narrowest dtypes: categories for repeated text, smallest ints, float32 when exact."""
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if values.dtype == object:
+            if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                values = values.astype('category')
+        elif pd.api.types.is_float_dtype(values):
+            finite = values.dropna()
+            if not values.hasnans and (finite % 1 == 0).all():
+                values = pd.to_numeric(values.astype('int64'), downcast='integer')
+            elif (finite.astype('float32').astype('float64') == finite).all():
+                # Counts and rates with missing values: float32 holds them exactly, with half the bytes
+                values = values.astype('float32')
+        elif pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, downcast='integer')
+        columns[column] = values
+    return DataFrame(columns, index=data.index)
+
+
+def column_options(values: pd.Series) -> list:
+    # Values a filter offers: the categories of a compacted column, the sorted values otherwise
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return list(values.cat.categories)
+    return sorted(values.dropna().unique().tolist())
+
+
+@instrumented
 def data_preprocessing(data: DataFrame) -> DataFrame:
-    columns_to_keep = [
-        'Annee', 'UAI', 'Etablissement', 'Secteur', 'Code commune', 'Commune',
-        'Code departement', 'Departement', 'Academie', 'Code region', 'Region',
-        'Presents - Toutes series', 'Taux de reussite - Toutes series',
-        'Valeur ajoutee du taux de reussite - Toutes series',
-        'Valeur ajoutee du taux d\'acces 2nde-bac', 'Taux de mentions - Toutes series',
-        'Valeur ajoutee du taux de mentions - Toutes series',
-        'Nombre de mentions TB avec felicitations - G', 'Nombre de mentions TB sans felicitations - G',
-        'Nombre de mentions B - G', 'Nombre de mentions AB - G',
-        'Nombre de mentions TB avec felicitations - T', 'Nombre de mentions TB sans felicitations - T',
-        'Nombre de mentions B - T', 'Nombre de mentions AB - T'
-    ]
-    data_filtered = data[columns_to_keep]
+    data_filtered = compact_dtypes(data[COLUMNS_TO_KEEP])
     return data_filtered
 
 
-def create_distribution_plot(data: DataFrame, column_names: list[str], year: int):
-    data = data[column_names]
-
-    filtered_data = data[data['Annee'] == year]
-
-    plt.figure(figsize=(4, 3))
-    sns.histplot(filtered_data[column_names[1]], kde=True, bins=20)
-    plt.xlabel(column_names[1])
-    plt.ylabel('Frequency')
-    plt.title(f'Distribution of {column_names[1]} in {year}')
-
-    return plt
-
-
-def create_trend_plot(data: DataFrame, column_name: str):
-    average_data = data.groupby("Annee")[column_name].mean().reset_index()
-
-    plt.figure(figsize=(10, 8))
-    plt.plot(average_data["Annee"], average_data[column_name], marker='o')
-    plt.xlabel("Année")
-    plt.ylabel(column_name)
-    plt.title(f'Average {column_name} over the years')
-
-    return plt
+class AggregateCube:
+    """Sums and non-null counts of every metric per (year, sector, department)."""
+
+    def __init__(self, table: DataFrame):
+        self.table = table
+
+    def mean(self, columns: str | list[str], by: list[str] = None, year: int = None):
+        column_list = [columns] if isinstance(columns, str) else list(columns)
+        table = self.table
+        if year is not None:
+            table = table[table.index.get_level_values('Annee') == year]
+
+        if by:
+            totals = table.groupby(level=by).sum()
+            means = totals.xs('sum', axis=1, level=1)[column_list] / totals.xs('count', axis=1, level=1)[column_list]
+            return means.reset_index()
 
-
-def create_pie_chart_2023(data: DataFrame, column_names: list[str]):
-    data_2023 = data[data['Annee'] == 2023]
-    data_avg_2023 = data_2023[column_names].mean()
-
-    plt.figure(figsize=(12, 10))
-    colors = plt.cm.get_cmap('tab10', len(column_names))
-
-    plt.pie(
+        totals = table.sum()
+        means = totals.xs('sum', level=1)[column_list] / totals.xs('count', level=1)[column_list]
+        return means[columns] if isinstance(columns, str) else means
+
+
+@instrumented
+def build_aggregate_cube(data: DataFrame) -> AggregateCube:
+    # Rows with a missing key are kept so that coarser levels still see all the values. Keys are grouped by
+    # value rather than by category and the sums are taken in float64, whatever the compact dtypes are.
+    keys = [data[key].astype(object) if isinstance(data[key].dtype, pd.CategoricalDtype) else data[key]
+            for key in CUBE_KEYS]
+    grouped = data[METRIC_COLUMNS].astype(float).groupby(keys, dropna=False)
+    return AggregateCube(grouped.agg(['sum', 'count']))
+
+
+class SchoolIndex:
+    """Rows of each school stored as one contiguous block sorted by year, located by UAI."""
+
+    def __init__(self, data: DataFrame, blocks: dict[str, tuple[int, int]]):
+        self.data = data
+        self.blocks = blocks
+
+    def rows(self, uai: str) -> DataFrame:
+        start, stop = self.blocks.get(uai, (0, 0))
+        return self.data.iloc[start:stop]
+
+    def name(self, uai: str) -> str:
+        # The latest name is used in case the school was renamed
+        start, stop = self.blocks[uai]
+        return self.data['Etablissement'].iat[stop - 1]
+
+    def label(self, uai: str) -> str:
+        start, stop = self.blocks[uai]
+        return f"{self.data['Etablissement'].iat[stop - 1]} ({self.data['Commune'].iat[stop - 1]}) - {uai}"
+
+
+@instrumented
+def build_school_index(data: DataFrame) -> SchoolIndex:
+    data = data[data['UAI'].notna()].sort_values(['UAI', 'Annee'], kind='stable').reset_index(drop=True)
+
+    uai = data['UAI'].to_numpy()
+    boundaries = np.flatnonzero(uai[1:] != uai[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(uai)]))
+
+    blocks = {school: (int(start), int(stop)) for school, start, stop in zip(uai[starts], starts, stops)}
+    return SchoolIndex(data, blocks)
+
+
+class RankingTable:
+    """Rank of every row on every metric within its year and area, aligned with the rows of the school index.
+
+    ranks[scope] is a (rows, metrics) array of ranks (1 is the highest value, 0 when the value is missing).
+    group_ids[scope] gives the (year, area) group of each row and group_counts[scope] the number of ranked
+    schools of each group and metric. groups[scope] holds the rows of each (year, area), so that a top list
+    only looks at the schools of that area.
+    """
+
+    def __init__(self, data: DataFrame, ranks: dict[str, np.ndarray], group_ids: dict[str, np.ndarray],
+                 group_counts: dict[str, np.ndarray], groups: dict[str, dict[tuple, np.ndarray]]):
+        self.data = data
+        self.ranks = ranks
+        self.group_ids = group_ids
+        self.group_counts = group_counts
+        self.groups = groups
+
+    @staticmethod
+    def percentiles(ranks: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        # 100 for the first school of the area, 0 for the last one
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(counts > 1, 100 * (counts - ranks) / (counts - 1.0), 100.0)
+        return np.where(ranks > 0, values, np.nan)
+
+    def school(self, schools: SchoolIndex, uai: str, year: int, scope: str) -> DataFrame:
+        """Rank, number of schools and percentile of a school on every metric, within its area that year."""
+        start, stop = schools.blocks[uai]
+        years = self.data['Annee'].to_numpy()[start:stop]
+        group = self.group_ids[scope][start:stop][years == year]
+        if len(group) == 0 or group[0] < 0:
+            return DataFrame(columns=['Rank', 'Out of', 'Percentile'])
+        row = start + int(np.flatnonzero(years == year)[0])
+
+        ranks, counts = self.ranks[scope][row].astype(int), self.group_counts[scope][group[0]].astype(int)
+        table = DataFrame({'Rank': ranks, 'Out of': counts,
+                           'Percentile': self.percentiles(ranks, counts).round(1)}, index=METRIC_COLUMNS)
+        return table[ranks > 0]
+
+    def top(self, scope: str, area: str, year: int, metric: str, n: int = 10) -> DataFrame:
+        """The n highest schools of an area on one metric that year."""
+        rows = self.groups[scope].get((year, area), np.empty(0, dtype=int))
+        ranks = self.ranks[scope][rows, METRIC_COLUMNS.index(metric)]
+        rows, ranks = rows[ranks > 0], ranks[ranks > 0]
+        order = np.argsort(ranks, kind='stable')[:n]
+
+        top = self.data.iloc[rows[order]][['UAI', 'Etablissement', 'Commune', metric]].reset_index(drop=True)
+        top.insert(0, 'Rank', ranks[order].astype(int))
+        return top
+
+
+@instrumented
+def build_ranking_table(schools: SchoolIndex) -> RankingTable:
+    data = schools.data
+    metrics = data[METRIC_COLUMNS].astype(float)
+    # Ranks never exceed the number of rows
+    rank_dtype = np.uint16 if len(data) < 2 ** 16 else np.uint32
+
+    ranks, group_ids, group_counts, groups = {}, {}, {}, {}
+    for scope in RANKING_SCOPES:
+        # One grouped rank over all the metrics at once; schools of an unknown area are not ranked
+        grouped = metrics.groupby([data['Annee'], data[scope]], observed=True, dropna=True)
+        ranks[scope] = grouped.rank(method='min', ascending=False).reindex(data.index).fillna(0).to_numpy(rank_dtype)
+        group_ids[scope] = grouped.ngroup().reindex(data.index).fillna(-1).to_numpy(np.int32)
+        group_counts[scope] = grouped.count().to_numpy(rank_dtype)
+        groups[scope] = {(int(year), area): rows for (year, area), rows in grouped.indices.items()}
+    return RankingTable(data, ranks, group_ids, group_counts, groups)
+
+
+class DistributionTable:
+    """Histogram counts and KDE curve (scaled to counts) of one column for every year, one row per year."""
+
+    def __init__(self, column: str, years: np.ndarray, edges: np.ndarray, counts: np.ndarray,
+                 kde_x: np.ndarray, kde_y: np.ndarray):
+        self.column = column
+        self.years = years
+        self.edges = edges
+        self.counts = counts
+        self.kde_x = kde_x
+        self.kde_y = kde_y
+
+    def row(self, year: int) -> int | None:
+        row = int(np.searchsorted(self.years, year))
+        return row if row < len(self.years) and self.years[row] == year else None
+
+
+def build_distribution_table(data: DataFrame, column: str) -> DistributionTable:
+    values = data[['Annee', column]].dropna()
+    order = np.argsort(values['Annee'].to_numpy(), kind='stable')
+    year_values = values['Annee'].to_numpy()[order]
+    x = values[column].to_numpy(dtype=float)[order]
+
+    # Every year is a contiguous segment of the year-sorted values
+    years, starts, sizes = np.unique(year_values, return_index=True, return_counts=True)
+    year_index = np.repeat(np.arange(len(years)), sizes)
+    minimums = np.minimum.reduceat(x, starts) if len(x) else np.empty(0)
+    maximums = np.maximum.reduceat(x, starts) if len(x) else np.empty(0)
+    # Like numpy, a year with a single distinct value gets a unit-wide range around it
+    constant = minimums == maximums
+    lows, highs = np.where(constant, minimums - 0.5, minimums), np.where(constant, maximums + 0.5, maximums)
+
+    # Equal-width bins between each year's min and max: the same edges, index formula and rounding
+    # corrections as np.histogram, so that values lying exactly on an edge land in the same bin
+    edges = np.linspace(lows, highs, DISTRIBUTION_BINS + 1, axis=1)
+    bins = np.floor((x - lows[year_index]) * (DISTRIBUTION_BINS / (highs - lows))[year_index]).astype(int)
+    bins = np.clip(bins, 0, DISTRIBUTION_BINS - 1)
+    bins -= x < edges[year_index, bins]
+    bins += (x >= edges[year_index, bins + 1]) & (bins != DISTRIBUTION_BINS - 1)
+    counts = np.bincount(year_index * DISTRIBUTION_BINS + bins,
+                         minlength=len(years) * DISTRIBUTION_BINS).reshape(len(years), DISTRIBUTION_BINS)
+
+    # Gaussian KDE with Scott's bandwidth, evaluated on a grid between each year's min and max
+    means = np.add.reduceat(x, starts) / sizes if len(x) else np.empty(0)
+    squares = np.add.reduceat((x - means[year_index]) ** 2, starts) if len(x) else np.empty(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bandwidths = np.sqrt(squares / (sizes - 1)) * sizes ** (-1 / 5)
+    kde_x = np.linspace(minimums, maximums, KDE_GRIDSIZE, axis=1)
+    kernel_sums = np.zeros((len(years), KDE_GRIDSIZE))
+    for chunk_start in range(0, len(x), KDE_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + KDE_CHUNK_SIZE)
+        chunk_years = year_index[chunk]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            kernels = np.exp(-0.5 * ((kde_x[chunk_years] - x[chunk, None]) / bandwidths[chunk_years, None]) ** 2)
+        segments = np.flatnonzero(np.diff(chunk_years, prepend=-1))
+        kernel_sums[chunk_years[segments]] += np.add.reduceat(kernels, segments, axis=0)
+
+    # Scaled like seaborn does for stat="count": density * number of values * bin width
+    bin_widths = (highs - lows) / DISTRIBUTION_BINS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kde_y = kernel_sums / (bandwidths * np.sqrt(2 * np.pi))[:, None] * bin_widths[:, None]
+
+    return DistributionTable(column, years, edges, counts, kde_x, kde_y)
+
+
+@instrumented
+def build_distribution_tables(data: DataFrame, columns: list[str]) -> dict[str, DistributionTable]:
+    return {column: build_distribution_table(data, column) for column in columns}
+
+
+def concat_distribution_tables(column: str, tables: list[DistributionTable]) -> DistributionTable:
+    # The tables must cover distinct years and be given in year order
+    if not tables:
+        return build_distribution_table(DataFrame(columns=['Annee', column]), column)
+    return DistributionTable(column, *(np.concatenate([getattr(table, field) for table in tables])
+                                       for field in ('years', 'edges', 'counts', 'kde_x', 'kde_y')))
+
+
+@instrumented
+def create_distribution_plot(distributions: dict[str, DistributionTable], column_name: str, year: int):
+    distribution = distributions[column_name]
+    row = distribution.row(year)
+
+    figure = Figure(figsize=(4, 3))
+    ax = figure.subplots()
+    if row is not None:
+        edges = distribution.edges[row]
+        ax.bar(edges[:-1], distribution.counts[row], width=np.diff(edges), align='edge', color='C0', alpha=0.75,
+                edgecolor='black', linewidth=0.5)
+        ax.plot(distribution.kde_x[row], distribution.kde_y[row], color='C0')
+    ax.set_xlabel(column_name)
+    ax.set_ylabel('Frequency')
+    ax.set_title(f'Distribution of {column_name} in {year}')
+
+    return figure
+
+
+@instrumented
+def create_distribution_overlay_plot(distributions: dict[str, DistributionTable], column_name: str):
+    distribution = distributions[column_name]
+    colors = matplotlib.colormaps['viridis'].resampled(len(distribution.years))
+
+    figure = Figure(figsize=(4, 3))
+    ax = figure.subplots()
+    for row, year in enumerate(distribution.years):
+        ax.plot(distribution.kde_x[row], distribution.kde_y[row], color=colors(row), label=str(year), linewidth=1)
+    ax.set_xlabel(column_name)
+    ax.set_ylabel('Frequency')
+    ax.set_title(f'Distribution of {column_name} over the years')
+    ax.legend(title='Année', fontsize=5, title_fontsize=6, ncol=2)
+
+    return figure
+
+
+@instrumented
+def create_trend_plot(cube: AggregateCube, column_name: str):
+    average_data = cube.mean(column_name, by=["Annee"])
+
+    figure = Figure(figsize=(10, 8))
+    ax = figure.subplots()
+    ax.plot(average_data["Annee"], average_data[column_name], marker='o')
+    ax.set_xlabel("Année")
+    ax.set_ylabel(column_name)
+    ax.set_title(f'Average {column_name} over the years')
+
+    return figure
+
+
+@instrumented
+def create_pie_chart_2023(cube: AggregateCube, column_names: list[str]):
+    data_avg_2023 = cube.mean(column_names, year=2023)
+
+    figure = Figure(figsize=(12, 10))
+    ax = figure.subplots()
+    colors = matplotlib.colormaps['tab10'].resampled(len(column_names))
+
+    ax.pie(
         data_avg_2023,
         labels=column_names,
         autopct='%1.1f%%',
@@ -70,113 +393,165 @@ def create_pie_chart_2023(data: DataFrame, column_names: list[str]):
         colors=[colors(i) for i in range(len(column_names))]
     )
 
-    plt.title('Proportion of each honours for the year 2023')
-    plt.axis('equal')
-    plt.show()
-
-    return plt
-
-
-def create_department_success_rate_map(data: pd.DataFrame, column_name: str):
-    geojson_path = "https://france-geojson.gregoiredavid.fr/repo/departements.geojson"
-    france_geo = gpd.read_file(geojson_path)
-
-    data_2023 = data[data['Annee'] == 2023]
-    data_avg = data_2023.groupby("Code departement")[column_name].mean().reset_index()
-
-    france_geo = france_geo.merge(data_avg, how='left', left_on='code', right_on='Code departement')
+    ax.set_title('Proportion of each honours for the year 2023')
+    ax.axis('equal')
+
+    return figure
+
+
+class MetricSwitch(MacroElement):
+    """Radio buttons restyling a GeoJson layer with the fill colors of the selected metric, with its legend."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var layer = {{ this.layer.get_name() }};
+            var control = L.control({position: "topright"});
+            control.onAdd = function () {
+                var div = L.DomUtil.create("div", "leaflet-control-layers leaflet-control-layers-expanded");
+                {{ this.metrics|tojson }}.forEach(function (metric, i) {
+                    var label = L.DomUtil.create("label", "", div);
+                    var input = L.DomUtil.create("input", "", label);
+                    input.type = "radio";
+                    input.name = "{{ this.get_name() }}";
+                    input.checked = i === 0;
+                    label.appendChild(document.createTextNode(" " + metric.name));
+                    var legend = L.DomUtil.create("div", "", div);
+                    legend.innerHTML = metric.legend;
+                    L.DomEvent.on(input, "change", function () {
+                        layer.setStyle(function (feature) { return {fillColor: feature.properties["fill " + i]}; });
+                    });
+                });
+                L.DomEvent.disableClickPropagation(div);
+                return div;
+            };
+            control.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer: folium.GeoJson, metrics: list[dict]):
+        super().__init__()
+        self._name = "MetricSwitch"
+        self.layer = layer
+        self.metrics = metrics
+
+
+def color_legend(colormap: branca.colormap.LinearColormap) -> str:
+    stops = ", ".join(colormap(colormap.vmin + (colormap.vmax - colormap.vmin) * k / 8) for k in range(9))
+    return (f'<div style="height: 10px; width: 200px; background: linear-gradient(to right, {stops});"></div>'
+            f'<div style="display: flex; justify-content: space-between; width: 200px;">'
+            f'<span>{colormap.vmin:.1f}</span><span>{colormap.vmax:.1f}</span></div>')
+
+
+@instrumented
+def create_department_map(cube: AggregateCube, column_names: list[str]):
+    france_geo = load_department_geometry()
+
+    # One layer holds the geometry once, with every metric's value and fill color as feature properties
+    properties = {}
+    metrics = []
+    for i, column_name in enumerate(column_names):
+        data_avg = cube.mean(column_name, by=["Code departement"], year=2023)
+        # The geometry is already ordered by department code, values only need to be aligned on it
+        values = data_avg.set_index("Code departement")[column_name].reindex(france_geo["code"]).round(2)
+        colormap = branca.colormap.linear.YlOrRd_09.scale(values.min(), values.max())
+        properties[column_name] = values.to_numpy()
+        properties[f"fill {i}"] = [colormap(value) if pd.notna(value) else "black" for value in values]
+        metrics.append({"name": column_name, "legend": color_legend(colormap)})
+    france_geo = france_geo[["code", "nom", "geometry"]].assign(**properties)
 
     m = folium.Map(location=[46.603354, 1.888334], zoom_start=6)
 
-    choropleth = folium.Choropleth(
-        geo_data=france_geo.to_json(),
-        data=data_avg,
-        columns=["Code departement", column_name],
-        key_on="feature.properties.code",
-        fill_color="YlOrRd",
-        fill_opacity=0.6,
-        line_opacity=0.5,
-        legend_name=column_name,
-    ).add_to(m)
-
     geojson_layer = folium.GeoJson(
         france_geo.to_json(),
         name="Departments",
+        style_function=lambda feature: {"fillColor": feature["properties"]["fill 0"], "fillOpacity": 0.6,
+                                        "color": "black", "weight": 1, "opacity": 0.5},
         tooltip=folium.GeoJsonTooltip(
-            fields=["nom", column_name],
-            aliases=["Department", column_name],
+            fields=["nom"] + column_names,
+            aliases=["Department"] + column_names,
             localize=True
         )
     ).add_to(m)
+    MetricSwitch(geojson_layer, metrics).add_to(m)
 
     return m
 
 
-def create_box_plot_type(data: DataFrame, column_name: str):
-    data_avg = data.groupby(['Annee', 'Secteur'])[column_name].mean().reset_index()
+@instrumented
+def create_box_plot_type(cube: AggregateCube, column_name: str):
+    data_avg = cube.mean(column_name, by=['Annee', 'Secteur'])
 
-    plt.figure(figsize=(12, 6))
-    sns.barplot(data=data_avg, x='Annee', y=column_name, hue='Secteur', palette='Set2')
+    figure = Figure(figsize=(12, 6))
+    ax = figure.subplots()
+    sns.barplot(data=data_avg, x='Annee', y=column_name, hue='Secteur', palette='Set2', ax=ax)
 
-    plt.title(f'Average {column_name} by Year and Secteur')
-    plt.xlabel('Année')
-    plt.ylabel(f'Average {column_name}')
-    plt.legend(title='Secteur')
-    plt.grid(True)
-    plt.tight_layout()
+    ax.set_title(f'Average {column_name} by Year and Secteur')
+    ax.set_xlabel('Année')
+    ax.set_ylabel(f'Average {column_name}')
+    ax.legend(title='Secteur')
+    ax.grid(True)
+    figure.tight_layout()
 
-    return plt
+    return figure
 
 
-def create_trends_rates_talma(data: DataFrame, column_names: list[str]):
-    data = data[data["UAI"] == '0911021R']
+@instrumented
+def create_trends_rates_school(schools: SchoolIndex, uai: str, column_names: list[str]):
+    data = schools.rows(uai)
     average_data = data.groupby("Annee")[column_names].mean().reset_index()
 
-    plt.figure(figsize=(10, 8))
+    figure = Figure(figsize=(10, 8))
+    ax = figure.subplots()
     for i, column in enumerate(column_names):
-        plt.plot(average_data["Annee"], average_data[column], marker='o', label=column)
+        ax.plot(average_data["Annee"], average_data[column], marker='o', label=column)
 
-    plt.xlabel("Année", fontsize=12)
-    plt.ylabel("Percentage", fontsize=12)
-    plt.title(f'Trends on the percentages of success and honor rate for the Talma high school', fontsize=14, fontweight='bold')
+    ax.set_xlabel("Année", fontsize=12)
+    ax.set_ylabel("Percentage", fontsize=12)
+    ax.set_title(f'Trends on the percentages of success and honor rate for {schools.name(uai)}', fontsize=14, fontweight='bold')
 
-    plt.legend(title='Metrics', fontsize=10, title_fontsize='12')
-    plt.grid(True)
-    plt.tight_layout()
+    ax.legend(title='Metrics', fontsize=10, title_fontsize='12')
+    ax.grid(True)
+    figure.tight_layout()
 
-    return plt
+    return figure
 
 
-def create_trends_added_values_talma(data: DataFrame, column_names: list[str]):
-    data = data[data["UAI"] == '0911021R']
+@instrumented
+def create_trends_added_values_school(schools: SchoolIndex, uai: str, column_names: list[str]):
+    data = schools.rows(uai)
     average_data = data.groupby("Annee")[column_names].mean().reset_index()
 
-    plt.figure(figsize=(10, 8))
+    figure = Figure(figsize=(10, 8))
+    ax = figure.subplots()
     for i, column in enumerate(column_names):
-        plt.plot(average_data["Annee"], average_data[column], marker='o', label=column)
+        ax.plot(average_data["Annee"], average_data[column], marker='o', label=column)
 
-    plt.xlabel("Année", fontsize=12)
-    plt.ylabel("Added value", fontsize=12)
-    plt.title(f'Trends on the added values of the Talma high school', fontsize=14, fontweight='bold')
+    ax.set_xlabel("Année", fontsize=12)
+    ax.set_ylabel("Added value", fontsize=12)
+    ax.set_title(f'Trends on the added values of {schools.name(uai)}', fontsize=14, fontweight='bold')
 
-    plt.legend(title='Metrics', fontsize=10, title_fontsize='12')
-    plt.grid(True)
-    plt.tight_layout()
+    ax.legend(title='Metrics', fontsize=10, title_fontsize='12')
+    ax.grid(True)
+    figure.tight_layout()
 
-    return plt
+    return figure
 
 
-def create_trend_number_students_talma(data: DataFrame, column_name: str):
-    data = data[data["UAI"] == '0911021R']
+@instrumented
+def create_trend_number_students_school(schools: SchoolIndex, uai: str, column_name: str):
+    data = schools.rows(uai)
     average_data = data.groupby("Annee")[column_name].mean().reset_index()
 
-    plt.figure(figsize=(10, 8))
-    plt.plot(average_data["Annee"], average_data[column_name], marker='o')
-    plt.xlabel("Année", fontsize=12)
-    plt.ylabel(column_name, fontsize=12)
-    plt.title(f'Average {column_name} over the years', fontsize=14, fontweight='bold')
-    plt.grid(True)
-    plt.tight_layout()
+    figure = Figure(figsize=(10, 8))
+    ax = figure.subplots()
+    ax.plot(average_data["Annee"], average_data[column_name], marker='o')
+    ax.set_xlabel("Année", fontsize=12)
+    ax.set_ylabel(column_name, fontsize=12)
+    ax.set_title(f'Average {column_name} over the years', fontsize=14, fontweight='bold')
+    ax.grid(True)
+    figure.tight_layout()
 
-    return plt
+    return figure
 
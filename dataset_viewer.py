@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from data_handling_and_plots import column_options
+from instrumentation import instrumented
+
+# Columns that get a filter in the raw data viewer, and the ones the text search looks into
+FILTER_COLUMNS = ['Annee', 'Secteur', 'Region', 'Academie', 'Departement']
+SEARCH_COLUMNS = ['Etablissement', 'Commune', 'UAI']
+PAGE_SIZE = 50
+
+
+class DatasetIndex:
+    """Sort orders and value lookups of one version of the dataset, so that a view only ever copies one page.
+
+    Filters and the text search are matched against the categories of a column (a few hundred values at most)
+    and then against its integer codes, instead of comparing every row's text.
+    """
+
+    def __init__(self, data: DataFrame):
+        self.data = data
+        self._orders: dict[tuple[str, bool], np.ndarray] = {}
+
+    def options(self, column: str) -> list:
+        return column_options(self.data[column])
+
+    def order(self, column: str, ascending: bool = True) -> np.ndarray:
+        # Row positions sorted on the column (missing values last), computed once per column and direction
+        key = (column, ascending)
+        if key not in self._orders:
+            values = self.data[column].reset_index(drop=True)
+            self._orders[key] = values.sort_values(ascending=ascending, kind='stable',
+                                                   na_position='last').index.to_numpy()
+        return self._orders[key]
+
+    def _matches(self, column: str, values: list) -> np.ndarray:
+        column_values = self.data[column]
+        if isinstance(column_values.dtype, pd.CategoricalDtype):
+            codes = column_values.cat.categories.get_indexer(values)
+            return np.isin(column_values.cat.codes.to_numpy(), codes[codes >= 0])
+        return column_values.isin(values).to_numpy()
+
+    def _search(self, column: str, text: str) -> np.ndarray:
+        column_values = self.data[column]
+        if isinstance(column_values.dtype, pd.CategoricalDtype):
+            categories = column_values.cat.categories
+            found = np.flatnonzero(categories.astype(str).str.contains(text, case=False, regex=False))
+            return np.isin(column_values.cat.codes.to_numpy(), found)
+        return column_values.astype(str).str.contains(text, case=False, regex=False).to_numpy()
+
+    @instrumented
+    def query(self, filters: dict[str, list] = None, search: str = "", sort_by: str = None,
+              ascending: bool = True) -> np.ndarray:
+        """Positions of the rows matching every filter and the search, in the requested order."""
+        mask = np.ones(len(self.data), dtype=bool)
+        for column, values in (filters or {}).items():
+            if values:
+                mask &= self._matches(column, values)
+
+        if search:
+            found = np.zeros(len(self.data), dtype=bool)
+            for column in SEARCH_COLUMNS:
+                found |= self._search(column, search)
+            mask &= found
+
+        if sort_by is None:
+            return np.flatnonzero(mask)
+        order = self.order(sort_by, ascending)
+        return order[mask[order]]
+
+    def page(self, rows: np.ndarray, page: int, page_size: int = PAGE_SIZE) -> DataFrame:
+        # Pages are numbered from 1 like in the viewer
+        return self.data.iloc[rows[(page - 1) * page_size:page * page_size]]
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+from functools import lru_cache
+import geopandas as gpd
+from geopandas import GeoDataFrame
+import shapely
+from file_utils import atomic_write
+from instrumentation import instrumented
+
+
+GEOJSON_URL = "https://france-geojson.gregoiredavid.fr/repo/departements.geojson"
+GEOMETRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "geometry")
+# Local copy of the source, used instead of the URL when the outlines have to be built
+LOCAL_GEOJSON = os.environ.get("DEPARTMENTS_GEOJSON", os.path.join(os.path.dirname(GEOMETRY_DIR),
+                                                                    "departements.geojson"))
+
+# Simplification tolerance in degrees for each level of detail (roughly 100 m, 500 m and 2 km)
+LEVELS_OF_DETAIL = {"high": 0.001, "medium": 0.005, "low": 0.02}
+DEFAULT_LEVEL_OF_DETAIL = "medium"
+
+# Coordinates are snapped to a grid of about 10 m, more than enough at department scale
+PRECISION = 0.0001
+
+_build_lock = threading.Lock()
+# Why building the outlines failed, so that it is only attempted once per process
+_build_error = None
+
+
+def geometry_path(level_of_detail: str) -> str:
+    return os.path.join(GEOMETRY_DIR, f"departements_{level_of_detail}.parquet")
+
+
+def simplify_departments(departments: GeoDataFrame, tolerance: float) -> GeoDataFrame:
+    geometry = shapely.set_precision(departments.geometry.values, PRECISION)
+
+    # Shared borders are simplified once so that neighbouring departments stay gap-free
+    if hasattr(shapely, "coverage_simplify"):
+        simplified = shapely.coverage_simplify(geometry, tolerance)
+    else:
+        simplified = shapely.simplify(geometry, tolerance, preserve_topology=True)
+
+    return departments.set_geometry(shapely.set_precision(simplified, PRECISION))
+
+
+@instrumented
+def build_department_geometry(source: str = None) -> dict[str, str]:
+    departments: GeoDataFrame = gpd.read_file(source or GEOJSON_URL)
+    departments = departments[["code", "nom", "geometry"]].sort_values("code").reset_index(drop=True)
+
+    os.makedirs(GEOMETRY_DIR, exist_ok=True)
+    paths = {}
+    for level_of_detail, tolerance in LEVELS_OF_DETAIL.items():
+        paths[level_of_detail] = geometry_path(level_of_detail)
+        # The app may read a level while another is being built
+        with atomic_write(paths[level_of_detail]) as file:
+            simplify_departments(departments, tolerance).to_parquet(file, index=False)
+
+    return paths
+
+
+def ensure_department_geometry(level_of_detail: str = DEFAULT_LEVEL_OF_DETAIL) -> str:
+    """Path of the outlines, built once from LOCAL_GEOJSON (or else the URL) when they were not shipped."""
+    global _build_error
+    path = geometry_path(level_of_detail)
+    if os.path.exists(path):
+        return path
+
+    with _build_lock:
+        if not os.path.exists(path) and _build_error is None:
+            source = LOCAL_GEOJSON if os.path.exists(LOCAL_GEOJSON) else GEOJSON_URL
+            try:
+                build_department_geometry(source)
+            except Exception as error:
+                _build_error = error
+        if _build_error is not None:
+            raise FileNotFoundError(f"No department geometry at {path}, and building it failed "
+                                    f"({_build_error!r}). Run 'python department_geometry.py' on a machine with "
+                                    f"network access (or with a local departements.geojson) and ship "
+                                    f"{GEOMETRY_DIR} with the app.") from _build_error
+    return path
+
+
+@lru_cache(maxsize=None)
+def load_department_geometry(level_of_detail: str = DEFAULT_LEVEL_OF_DETAIL) -> GeoDataFrame:
+    return gpd.read_parquet(ensure_department_geometry(level_of_detail))
+
+
+if __name__ == "__main__":
+    # Usage: python department_geometry.py [path or URL of departements.geojson]
+    for level, written in build_department_geometry(*sys.argv[1:2]).items():
+        print(f"{level}: {written} ({os.path.getsize(written) / 1024:.0f} KiB)")
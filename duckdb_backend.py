@@ -0,0 +1,72 @@
+import os
+import threading
+import pandas as pd
+from pandas import DataFrame
+from data_handling_and_plots import parquet_cache
+from instrumentation import instrumented
+
+# DuckDB is optional: the pandas aggregate cube is used unless QUERY_BACKEND=duckdb
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "pandas")
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class DuckDBCube:
+    """Same mean() queries as AggregateCube, pushed down to an in-process DuckDB over the Parquet cache.
+
+    DuckDB only scans the columns a query uses, skips row groups with its filters and runs on every core.
+    """
+
+    def __init__(self, parquet_path: str):
+        if duckdb is None:
+            raise ImportError("QUERY_BACKEND=duckdb needs the duckdb package: pip install duckdb")
+        self.parquet_path = parquet_path
+        self.connection = duckdb.connect(":memory:")
+        self._lock = threading.Lock()
+
+    @instrumented
+    def mean(self, columns: str | list[str], by: list[str] = None, year: int = None):
+        column_list = [columns] if isinstance(columns, str) else list(columns)
+        keys = list(by or [])
+
+        # Sums and non-null counts like the pandas cube; rows with a missing group key are left out like groupby does
+        aggregates = [f"fsum({quote(column)}), count({quote(column)})" for column in column_list]
+        conditions = [f"{quote(key)} IS NOT NULL" for key in keys]
+        parameters = []
+        if year is not None:
+            conditions.append('"Annee" = ?')
+            parameters.append(year)
+
+        query = f"SELECT {', '.join([quote(key) for key in keys] + aggregates)} FROM read_parquet(?)"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if keys:
+            query += f" GROUP BY ALL ORDER BY {', '.join(quote(key) for key in keys)}"
+
+        # A cursor per query, as a DuckDB connection must not be used by two threads at once
+        with self._lock:
+            cursor = self.connection.cursor()
+        rows = cursor.execute(query, [self.parquet_path] + parameters).fetchall()
+        cursor.close()
+
+        result = DataFrame(rows, columns=keys + [f"{stat} {column}" for column in column_list
+                                                 for stat in ("sum", "count")])
+        means = DataFrame({column: result[f"sum {column}"].astype(float) / result[f"count {column}"]
+                           for column in column_list})
+
+        if keys:
+            return pd.concat([result[keys], means], axis=1)
+        means = means.iloc[0] if len(means) else pd.Series(float("nan"), index=column_list)
+        means.name = None
+        return means[columns] if isinstance(columns, str) else means
+
+
+def build_duckdb_cube(path: str = None) -> DuckDBCube:
+    return DuckDBCube(parquet_cache(path))
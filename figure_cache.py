@@ -0,0 +1,155 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from matplotlib.figure import Figure
+from file_utils import atomic_write
+from instrumentation import mark_cache, span
+
+
+class FigureCache:
+    """Rendered figures by content key, evicting the least recently used ones past a byte budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key: str, image: bytes):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            # An image larger than the whole budget is returned to the caller but never stored
+            if len(image) > self.max_bytes:
+                return
+            self._entries[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+FIGURE_CACHE = FigureCache(int(os.environ.get("FIGURE_CACHE_BYTES", 64 * 1024 * 1024)))
+# Figures and maps written ahead of time by prebuild.py, one directory per version of the data
+ARTIFACT_DIR = os.path.join(os.environ.get("CACHE_DIR", ".cache"), "artifacts")
+# st.image decodes, resizes and re-encodes any image wider than its maximum content width (1460 px) on every
+# rerun, so figures are rendered at most that wide and their cached bytes are sent as they are
+MAX_IMAGE_WIDTH = 1460
+IMAGE_DPI = 200
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+
+_render_pool: ThreadPoolExecutor | None = None
+_render_pool_lock = threading.Lock()
+
+
+def figure_key(builder: Callable, args: tuple, data_version: str, image_format: str) -> str:
+    # The width limit is part of the key so that images cached or prebuilt with another limit are not reused
+    description = (f"{builder.__module__}.{builder.__qualname__}|{args!r}|{data_version}|{image_format}|"
+                   f"{MAX_IMAGE_WIDTH}")
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def artifact_path(key: str, data_version: str, image_format: str) -> str:
+    return os.path.join(ARTIFACT_DIR, data_version, f"{key}.{image_format}")
+
+
+def read_artifact(key: str, data_version: str, image_format: str) -> bytes | None:
+    path = artifact_path(key, data_version, image_format)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def write_artifact(key: str, data_version: str, image_format: str, data: bytes) -> str:
+    path = artifact_path(key, data_version, image_format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as file:
+        file.write(data)
+    return path
+
+
+def figure_to_bytes(figure: Figure, image_format: str = "png") -> bytes:
+    buffer = io.BytesIO()
+    # Same options as st.pyplot, except that wide figures get a lower dpi to fit in MAX_IMAGE_WIDTH pixels.
+    # Builders create their Figure outside of pyplot, so there is no global figure to close.
+    # Width in inches of the tight bounding box plus the 0.1 inch padding savefig adds on each side. Text extents
+    # depend a little on the dpi, so the box is measured again at the lower dpi, with a few pixels to spare.
+    try:
+        dpi = IMAGE_DPI
+        for _ in range(2):
+            figure.set_dpi(dpi)
+            dpi = min(IMAGE_DPI, (MAX_IMAGE_WIDTH - 4) / (figure.get_tightbbox().width + 0.2))
+        figure.savefig(buffer, format=image_format, bbox_inches="tight", dpi=dpi)
+    finally:
+        # The Figure and its canvas reference each other, so dropping the Figure does not free it: only the cycle
+        # collector would. Clearing it releases its axes, artists and their data as soon as the image is saved.
+        figure.clear()
+    return buffer.getvalue()
+
+
+def render_figure(builder: Callable, data, *args, data_version: str, image_format: str = "png",
+                  cache: FigureCache = FIGURE_CACHE) -> bytes:
+    """Return the image of builder(data, *args), rendering it only if it is not cached yet.
+
+    The data itself is not hashed: data_version (the dataset fingerprint) stands for it in the key.
+    """
+    with span(f"render_figure {builder.__name__}"):
+        key = figure_key(builder, args, data_version, image_format)
+        image = cache.get(key)
+        mark_cache(hit=image is not None)
+        if image is None:
+            # A prebuilt image is read from disk once, then kept in memory like a rendered one
+            image = read_artifact(key, data_version, image_format)
+            if image is None:
+                image = figure_to_bytes(builder(data, *args), image_format)
+            cache.put(key, image)
+        return image
+
+
+def render_pool() -> ThreadPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="figure-render")
+        return _render_pool
+
+
+def render_figures(jobs: list[tuple], data_version: str, image_format: str = "png",
+                   cache: FigureCache = FIGURE_CACHE) -> list[bytes]:
+    """Render several (builder, data, *args) jobs at once on the render pool, in the order given.
+
+    Each builder draws on its own Figure and Agg canvas, so the jobs share no matplotlib state. Threads
+    rather than processes: the data stays shared, and Agg rasterizing and PNG compression release the GIL.
+    """
+    with span("render_figures", jobs=len(jobs)):
+        futures = [render_pool().submit(render_figure, builder, data, *args, data_version=data_version,
+                                        image_format=image_format, cache=cache)
+                   for builder, data, *args in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,35 @@
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+
+# Light on purpose: the Profile page imports it, next to its images and word clouds
+
+_hashes: dict[tuple, str] = {}
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of the file's content, read again only when its modification time or size changed."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb"):
+    """File to write path through: a temporary file moved over path once complete, so readers never see half of it."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,59 @@
+import io
+import os
+from functools import lru_cache
+from PIL import Image
+from file_utils import atomic_write, file_hash
+
+
+ASSET_DIR = os.path.join(os.environ.get("CACHE_DIR", ".cache"), "images")
+
+# Width of the project images, shown in a 2/7 column of the wide layout
+PROJECT_IMAGE_WIDTH = 480
+JPEG_QUALITY = 85
+
+def encode_variant(image: Image.Image, width: int) -> tuple[bytes, str]:
+    # Never upscaled: a small logo is sent as it is, only recompressed
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), resample=Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "P"):
+        # Transparent logos stay PNG, as st.image would convert any other format back to PNG
+        image.save(buffer, format="png", optimize=True)
+        return buffer.getvalue(), "png"
+    image.convert("RGB").save(buffer, format="jpeg", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue(), "jpg"
+
+
+@lru_cache(maxsize=None)
+def _cached_variant(digest: str, path: str, width: int) -> bytes:
+    for extension in ("png", "jpg"):
+        variant_path = os.path.join(ASSET_DIR, f"{digest}_{width}.{extension}")
+        if os.path.exists(variant_path):
+            with open(variant_path, "rb") as file:
+                return file.read()
+
+    with Image.open(path) as image:
+        data, extension = encode_variant(image, width)
+        original_fits = image.width <= width and image.format == {"png": "PNG", "jpg": "JPEG"}[extension]
+    if original_fits and os.path.getsize(path) <= len(data):
+        # Already small enough and better compressed than what Pillow produces
+        with open(path, "rb") as file:
+            data = file.read()
+
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    variant_path = os.path.join(ASSET_DIR, f"{digest}_{width}.{extension}")
+    with atomic_write(variant_path) as file:
+        file.write(data)
+    return data
+
+
+def image_variant(path: str, width: int) -> bytes | str:
+    """Image resized to the width it is displayed at, encoded once per version of the file and kept in memory.
+
+    The variant is never wider than the display width, so st.image sends the bytes as they are instead of
+    resizing and re-encoding the original on every rerun. SVG files are vector images and are returned as paths.
+    """
+    if path.endswith(".svg"):
+        return path
+    return _cached_variant(file_hash(path), path, width)
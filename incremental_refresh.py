@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import data_handling_and_plots
+from data_handling_and_plots import (COLUMNS_TO_KEEP, DISTRIBUTION_COLUMNS, RANKING_SCOPES, AggregateCube,
+                                     DistributionTable, RankingTable, SchoolIndex, build_aggregate_cube,
+                                     build_distribution_tables, build_ranking_table, build_school_index,
+                                     compact_dtypes, concat_distribution_tables, data_preprocessing, load_dataset)
+from file_utils import atomic_write
+from instrumentation import instrumented
+
+# SERVE_ONLY=1 serves the partitions written by prebuild.py as they are: the source CSV is neither read nor
+# watched, so it does not even have to be shipped with the app
+SERVE_ONLY = os.environ.get("SERVE_ONLY") == "1"
+
+DISTRIBUTION_FIELDS = ('years', 'edges', 'counts', 'kde_x', 'kde_y')
+
+
+class DatasetSnapshot:
+    """Read-only dataset and derived structures of one version of the data."""
+
+    def __init__(self, version: str, data: DataFrame, cube: AggregateCube, schools: SchoolIndex,
+                 distributions: dict[str, DistributionTable], rankings: RankingTable):
+        self.version = version
+        self.data = data
+        self.cube = cube
+        self.schools = schools
+        self.distributions = distributions
+        self.rankings = rankings
+
+
+def partition_hash(data: DataFrame) -> str:
+    # Hashed in float64 and object dtypes: the compact dtypes are picked on the whole dataset, so a missing value
+    # in a new year can turn a column from int16 to float32 in every year without changing any of their values
+    columns = {column: data[column].astype(float) if pd.api.types.is_numeric_dtype(data[column])
+               else data[column].astype(object) for column in data.columns}
+    normalized = DataFrame(columns, index=data.index)
+    return hashlib.sha256(pd.util.hash_pandas_object(normalized, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def distribution_arrays(distributions: dict[str, DistributionTable]) -> dict[str, np.ndarray]:
+    return {f"{column}|{field}": getattr(table, field)
+            for column, table in distributions.items() for field in DISTRIBUTION_FIELDS}
+
+
+def read_distributions(path: str) -> dict[str, DistributionTable]:
+    with np.load(path) as arrays:
+        return {column: DistributionTable(column, *(arrays[f"{column}|{field}"] for field in DISTRIBUTION_FIELDS))
+                for column in DISTRIBUTION_COLUMNS}
+
+
+def ranking_arrays(version: str, rankings: RankingTable) -> dict[str, np.ndarray]:
+    arrays = {"version": np.array(version)}
+    for scope in RANKING_SCOPES:
+        # The (year, area) of each group, in the order of the group ids
+        keys = sorted(rankings.groups[scope].items(), key=lambda item: rankings.group_ids[scope][item[1][0]])
+        arrays[f"{scope}|ranks"] = rankings.ranks[scope]
+        arrays[f"{scope}|group_ids"] = rankings.group_ids[scope]
+        arrays[f"{scope}|group_counts"] = rankings.group_counts[scope]
+        arrays[f"{scope}|group_years"] = np.array([year for (year, area), rows in keys], dtype=int)
+        arrays[f"{scope}|group_areas"] = np.array([str(area) for (year, area), rows in keys], dtype=str)
+    return arrays
+
+
+def read_rankings(path: str, version: str, schools: SchoolIndex) -> RankingTable | None:
+    # Ranks are aligned with the rows of the school index, which only one version of the data has
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        if str(arrays["version"]) != version:
+            return None
+        ranks, group_ids, group_counts, groups = {}, {}, {}, {}
+        for scope in RANKING_SCOPES:
+            ranks[scope] = arrays[f"{scope}|ranks"]
+            group_ids[scope] = arrays[f"{scope}|group_ids"]
+            group_counts[scope] = arrays[f"{scope}|group_counts"]
+            # Rows of each group in index order, like groupby().indices gives them
+            order = np.argsort(group_ids[scope], kind='stable')
+            bounds = np.searchsorted(group_ids[scope][order], np.arange(len(group_counts[scope]) + 1))
+            groups[scope] = {(int(year), str(area)): order[start:stop] for year, area, start, stop
+                             in zip(arrays[f"{scope}|group_years"], arrays[f"{scope}|group_areas"], bounds[:-1],
+                                    bounds[1:])}
+    return RankingTable(schools.data, ranks, group_ids, group_counts, groups)
+
+
+class DatasetStore:
+    """Local copy of the dataset partitioned by year, refreshed one changed year at a time.
+
+    Each year keeps its own rows, cube slice and histogram rows, so a new or corrected year only
+    recomputes those; all three are stored, so a restart reads them back. The school index spans all
+    years and is rebuilt from the assembled rows (a sort on two key columns), the ranking table built on
+    it is stored for the latest version. Readers always get a complete snapshot; a refresh swaps it in
+    when done.
+    """
+
+    def __init__(self, path: str = None, directory: str = None):
+        self.path = path or data_handling_and_plots.DATASET_PATH
+        self.directory = directory or os.path.join(data_handling_and_plots.CACHE_DIR, "partitions")
+        self.snapshot: DatasetSnapshot | None = None
+        self._source_stat = None
+        self._partitions: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._refresh_thread: threading.Thread | None = None
+
+    def _stat(self) -> list:
+        stat = os.stat(self.path)
+        return [os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size]
+
+    def _partition_path(self, year: int) -> str:
+        return os.path.join(self.directory, f"Annee={year}.parquet")
+
+    def _cube_path(self, year: int) -> str:
+        return os.path.join(self.directory, f"Annee={year}.cube.parquet")
+
+    def _distributions_path(self, year: int) -> str:
+        return os.path.join(self.directory, f"Annee={year}.distributions.npz")
+
+    def _rankings_path(self) -> str:
+        return os.path.join(self.directory, "rankings.npz")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _add_partition(self, year: int, data: DataFrame, digest: str):
+        self._partitions[year] = {
+            "hash": digest,
+            "data": data,
+            "cube": build_aggregate_cube(data).table,
+            "distributions": build_distribution_tables(data, DISTRIBUTION_COLUMNS),
+        }
+        if SERVE_ONLY:
+            # Partitions prebuilt before the derived tables were stored: nothing is written when serving
+            return
+        with atomic_write(self._cube_path(year)) as file:
+            self._partitions[year]["cube"].to_parquet(file)
+        with atomic_write(self._distributions_path(year)) as file:
+            np.savez(file, **distribution_arrays(self._partitions[year]["distributions"]))
+
+    def _load_partitions(self, manifest: dict):
+        for year, digest in manifest["partitions"].items():
+            year = int(year)
+            data = pd.read_parquet(self._partition_path(year), memory_map=True)
+            if os.path.exists(self._cube_path(year)) and os.path.exists(self._distributions_path(year)):
+                self._partitions[year] = {"hash": digest, "data": data,
+                                          "cube": pd.read_parquet(self._cube_path(year), memory_map=True),
+                                          "distributions": read_distributions(self._distributions_path(year))}
+            else:
+                self._add_partition(year, data, digest)
+
+    def _read_manifest(self) -> dict | None:
+        if not os.path.exists(self._manifest_path()):
+            return None
+        with open(self._manifest_path()) as file:
+            manifest = json.load(file)
+        if not all(os.path.exists(self._partition_path(int(year))) for year in manifest["partitions"]):
+            return None
+        return manifest
+
+    @instrumented
+    def _update_partitions(self, data: DataFrame) -> list[int]:
+        changed = []
+        years = set()
+        for year, year_data in data.groupby('Annee', sort=True):
+            year = int(year)
+            years.add(year)
+            year_data = year_data.reset_index(drop=True)
+            digest = partition_hash(year_data)
+            if self._partitions.get(year, {}).get("hash") == digest:
+                continue
+
+            with atomic_write(self._partition_path(year)) as file:
+                year_data.to_parquet(file, index=False)
+            self._add_partition(year, year_data, digest)
+            changed.append(year)
+
+        for year in set(self._partitions) - years:
+            del self._partitions[year]
+            for path in (self._partition_path(year), self._cube_path(year), self._distributions_path(year)):
+                if os.path.exists(path):
+                    os.remove(path)
+            changed.append(year)
+        return changed
+
+    def _write_manifest(self):
+        manifest = {"source": self._source_stat,
+                    "partitions": {str(year): partition["hash"] for year, partition in self._partitions.items()}}
+        with atomic_write(self._manifest_path(), "w") as file:
+            json.dump(manifest, file)
+
+    def _assemble(self) -> DatasetSnapshot:
+        years = sorted(self._partitions)
+        partitions = [self._partitions[year] for year in years]
+        version = hashlib.sha256("|".join(f"{year}:{self._partitions[year]['hash']}"
+                                          for year in years).encode()).hexdigest()
+
+        if partitions:
+            # Partitions written at different times may disagree on categories or widths, which concat widens
+            data = compact_dtypes(pd.concat([partition["data"] for partition in partitions], ignore_index=True))
+            cube = AggregateCube(pd.concat([partition["cube"] for partition in partitions]).sort_index())
+        else:
+            data = DataFrame(columns=COLUMNS_TO_KEEP)
+            cube = build_aggregate_cube(data)
+        distributions = {column: concat_distribution_tables(column, [partition["distributions"][column]
+                                                                     for partition in partitions])
+                         for column in DISTRIBUTION_COLUMNS}
+        schools = build_school_index(data)
+        rankings = read_rankings(self._rankings_path(), version, schools)
+        if rankings is None:
+            rankings = build_ranking_table(schools)
+            if not SERVE_ONLY:
+                with atomic_write(self._rankings_path()) as file:
+                    np.savez(file, **ranking_arrays(version, rankings))
+        return DatasetSnapshot(version, data, cube, schools, distributions, rankings)
+
+    def _load_prebuilt(self) -> DatasetSnapshot:
+        if self.snapshot is None:
+            manifest = self._read_manifest()
+            if manifest is None:
+                raise FileNotFoundError(f"SERVE_ONLY=1 but there are no prebuilt partitions in {self.directory}, "
+                                        f"run python prebuild.py first")
+            self._load_partitions(manifest)
+            self.snapshot = self._assemble()
+        return self.snapshot
+
+    @instrumented
+    def refresh(self) -> DatasetSnapshot:
+        with self._lock:
+            if SERVE_ONLY:
+                return self._load_prebuilt()
+
+            source_stat = self._stat()
+            if self.snapshot is not None and source_stat == self._source_stat:
+                return self.snapshot
+
+            os.makedirs(self.directory, exist_ok=True)
+            manifest = self._read_manifest()
+
+            # Partitions written by a previous run are reused: on an unchanged source the CSV is not even
+            # read, otherwise only the years that changed since then are rewritten and recomputed
+            if not self._partitions and manifest is not None:
+                self._load_partitions(manifest)
+            if manifest is None or manifest["source"] != source_stat:
+                self._update_partitions(data_preprocessing(load_dataset(self.path)))
+            self._source_stat = source_stat
+            self._write_manifest()
+
+            self.snapshot = self._assemble()
+            return self.snapshot
+
+    def source_changed(self) -> bool:
+        return not SERVE_ONLY and self._stat() != self._source_stat
+
+    def current(self) -> DatasetSnapshot:
+        """Latest complete snapshot; a changed source is refreshed in the background meanwhile."""
+        if self.snapshot is None:
+            return self.refresh()
+
+        if self.source_changed() and (self._refresh_thread is None or not self._refresh_thread.is_alive()):
+            self._refresh_thread = threading.Thread(target=self.refresh, name="dataset-refresh", daemon=True)
+            self._refresh_thread.start()
+        return self.snapshot
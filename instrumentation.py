@@ -0,0 +1,132 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+# Off unless the server is started with PROFILING=1
+ENABLED = os.environ.get("PROFILING", "") not in ("", "0")
+MAX_RECORDS = 5000
+
+_records: deque[dict] = deque(maxlen=MAX_RECORDS)
+_records_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack() -> list[dict]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Record the wall time, peak allocated memory and cache outcome of the enclosed block.
+
+    Peaks come from tracemalloc, which is process-wide: spans running at the same time in
+    other threads add to each other's peaks.
+    """
+    if not ENABLED:
+        yield None
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    stack = _stack()
+    current, peak = tracemalloc.get_traced_memory()
+    # The parent keeps the peak reached so far before it is reset for this span
+    if stack:
+        stack[-1]["max_memory"] = max(stack[-1]["max_memory"], peak)
+    tracemalloc.reset_peak()
+
+    record = {"name": name, "labels": labels, "cache": None, "thread": threading.current_thread().name,
+              "start": time.time(), "base_memory": current, "max_memory": current}
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["max_memory"] = max(record["max_memory"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        stack.pop()
+        if stack:
+            stack[-1]["max_memory"] = max(stack[-1]["max_memory"], record["max_memory"])
+
+        record["peak_bytes"] = record.pop("max_memory") - record.pop("base_memory")
+        with _records_lock:
+            _records.append(record)
+
+
+def mark_cache(hit: bool):
+    """Set the cache outcome of the innermost running span, if any."""
+    stack = _stack() if ENABLED else None
+    if stack:
+        stack[-1]["cache"] = "hit" if hit else "miss"
+
+
+def instrumented(function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return function(*args, **kwargs)
+        with span(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def records() -> list[dict]:
+    with _records_lock:
+        return list(_records)
+
+
+def clear():
+    with _records_lock:
+        _records.clear()
+
+
+def summary() -> dict[str, dict]:
+    totals = {}
+    for record in records():
+        total = totals.setdefault(record["name"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                                   "max_peak_bytes": 0, "hits": 0, "misses": 0})
+        total["calls"] += 1
+        total["seconds"] += record["seconds"]
+        total["max_seconds"] = max(total["max_seconds"], record["seconds"])
+        total["max_peak_bytes"] = max(total["max_peak_bytes"], record["peak_bytes"])
+        if record["cache"] is not None:
+            total["hits" if record["cache"] == "hit" else "misses"] += 1
+    return totals
+
+
+def export_jsonl() -> str:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records())
+
+
+def export_prometheus() -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    metrics = [
+        ("dashboard_span_calls_total", "counter", "Number of times the span ran.", "calls"),
+        ("dashboard_span_seconds_total", "counter", "Total wall time spent in the span.", "seconds"),
+        ("dashboard_span_seconds_max", "gauge", "Longest wall time of a single run of the span.", "max_seconds"),
+        ("dashboard_span_peak_bytes_max", "gauge", "Highest peak of allocated memory during the span.",
+         "max_peak_bytes"),
+    ]
+    totals = summary()
+    lines = []
+    for metric, metric_type, description, field in metrics:
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {metric_type}"]
+        lines += [f'{metric}{{span="{escape(name)}"}} {total[field]}' for name, total in totals.items()]
+
+    lines += ["# HELP dashboard_span_cache_total Cache lookups made by the span, by outcome.",
+              "# TYPE dashboard_span_cache_total counter"]
+    for name, total in totals.items():
+        lines.append(f'dashboard_span_cache_total{{span="{escape(name)}",result="hit"}} {total["hits"]}')
+        lines.append(f'dashboard_span_cache_total{{span="{escape(name)}",result="miss"}} {total["misses"]}')
+    return "\n".join(lines) + "\n"
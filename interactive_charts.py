@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import plotly.graph_objects as go
+from data_handling_and_plots import AggregateCube, DistributionTable, SchoolIndex
+from instrumentation import instrumented
+
+# CHART_MODE=interactive draws the exploration page with Plotly: each chart is sent to the browser once with
+# its pre-aggregated values, and year selection, hover and series toggles happen there without any rerun
+CHART_MODE = os.environ.get("CHART_MODE", "static")
+
+SCHOOL_VIEWS = {
+    "Rates": ["Taux de reussite - Toutes series", "Taux de mentions - Toutes series"],
+    "Added Values": ["Valeur ajoutee du taux de reussite - Toutes series",
+                     "Valeur ajoutee du taux de mentions - Toutes series"],
+    "Number of students": ["Presents - Toutes series"],
+}
+SCHOOL_AXIS_TITLES = {"Rates": "Percentage", "Added Values": "Added value",
+                      "Number of students": "Presents - Toutes series"}
+
+
+@instrumented
+def distribution_figure(distribution: DistributionTable) -> go.Figure:
+    """Histogram and KDE of every year, one year shown at a time with a slider, or all the KDE curves at once."""
+    figure = go.Figure()
+    years = [int(year) for year in distribution.years]
+    for row, year in enumerate(years):
+        edges = distribution.edges[row]
+        figure.add_bar(x=(edges[:-1] + edges[1:]) / 2, y=distribution.counts[row], width=np.diff(edges),
+                       name=str(year), legendgroup=str(year), showlegend=False, visible=row == 0, opacity=0.75,
+                       marker={"color": "#1f77b4", "line": {"color": "black", "width": 0.5}})
+        # Three decimals are plenty on screen and keep the 200-point curves small in the JSON sent to the browser
+        figure.add_scatter(x=distribution.kde_x[row].round(3), y=distribution.kde_y[row].round(3), mode="lines",
+                           name=str(year), legendgroup=str(year), visible=row == 0)
+
+    # Bars and curve of a year are traces 2 * row and 2 * row + 1
+    steps = [{"label": str(year), "method": "update",
+              "args": [{"visible": [trace // 2 == row for trace in range(2 * len(years))],
+                        "showlegend": False},
+                       {"title": f"Distribution of {distribution.column} in {year}"}]}
+             for row, year in enumerate(years)]
+    overlay = [{"visible": [trace % 2 == 1 for trace in range(2 * len(years))], "showlegend": True},
+               {"title": f"Distribution of {distribution.column} over the years"}]
+
+    figure.update_layout(
+        title=f"Distribution of {distribution.column} in {years[0]}" if years else distribution.column,
+        xaxis_title=distribution.column, yaxis_title="Frequency", legend_title="Année",
+        sliders=[{"active": 0, "currentvalue": {"prefix": "Year: "}, "steps": steps}],
+        updatemenus=[{"type": "buttons", "direction": "right", "x": 1, "y": 1.15, "showactive": False,
+                      "buttons": [{"label": "Overlay all the years", "method": "update",
+                                   "args": overlay}]}])
+    return figure
+
+
+@instrumented
+def trend_figure(cube: AggregateCube, column_name: str) -> go.Figure:
+    data_avg = cube.mean(column_name, by=['Annee'])
+
+    figure = go.Figure(go.Scatter(x=data_avg['Annee'], y=data_avg[column_name], mode="lines+markers",
+                                  name=column_name))
+    figure.update_layout(title=f'Average {column_name} over the years', xaxis_title='Année',
+                         yaxis_title=column_name)
+    return figure
+
+
+@instrumented
+def sector_figure(cube: AggregateCube, column_name: str) -> go.Figure:
+    data_avg = cube.mean(column_name, by=['Annee', 'Secteur'])
+
+    figure = go.Figure([go.Bar(x=rows['Annee'], y=rows[column_name], name=str(sector))
+                        for sector, rows in data_avg.groupby('Secteur')])
+    figure.update_layout(title=f'Average {column_name} by Year and Secteur', xaxis_title='Année',
+                         yaxis_title=column_name, legend_title='Secteur', barmode='group')
+    return figure
+
+
+@instrumented
+def pie_figure(cube: AggregateCube, column_names: list[str]) -> go.Figure:
+    data_avg_2023 = cube.mean(column_names, year=2023)
+
+    figure = go.Figure(go.Pie(labels=column_names, values=data_avg_2023.to_numpy(), sort=False,
+                              direction="counterclockwise", rotation=90))
+    figure.update_layout(title='Proportion of each honours for the year 2023')
+    return figure
+
+
+@instrumented
+def school_figure(schools: SchoolIndex, uai: str) -> go.Figure:
+    """Yearly values of one school, with buttons switching between the rates, added values and students."""
+    columns = [column for view_columns in SCHOOL_VIEWS.values() for column in view_columns]
+    average_data = schools.rows(uai).groupby("Annee")[columns].mean().reset_index()
+
+    figure = go.Figure()
+    buttons = []
+    for view, view_columns in SCHOOL_VIEWS.items():
+        for column in view_columns:
+            figure.add_scatter(x=average_data["Annee"], y=average_data[column], mode="lines+markers", name=column,
+                               visible=view == "Rates")
+        buttons.append({"label": view, "method": "update",
+                        "args": [{"visible": [column in view_columns for column in columns]},
+                                 {"yaxis.title.text": SCHOOL_AXIS_TITLES[view]}]})
+
+    figure.update_layout(title=f'Trends of {schools.name(uai)}', xaxis_title="Année",
+                         yaxis_title=SCHOOL_AXIS_TITLES["Rates"], legend_title='Metrics',
+                         updatemenus=[{"type": "buttons", "direction": "right", "x": 0, "xanchor": "left", "y": 1.15,
+                                       "buttons": buttons}])
+    return figure
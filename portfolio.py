@@ -1,13 +1,21 @@
+import hmac
+import os
 import streamlit as st
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import numpy as np
-from PIL import Image
-from streamlit_pages import exploration_page
+import preload
+from instrumentation import instrumented
+from image_assets import PROJECT_IMAGE_WIDTH, image_variant
+from skill_wordclouds import HARD_SKILLS, SOFT_SKILLS, render_wordcloud
 
 st.set_page_config(page_title="Quentin Baudet's Dashboard", layout="wide", page_icon=":palm_tree:")
 
+# Hidden debug panel at the bottom of the page, only when the server sets DEBUG_TOKEN and the page is opened
+# with ?debug=<that token>. It shows the spans recorded with PROFILING=1, a visitor can never start recording.
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+debug_mode = bool(DEBUG_TOKEN) and hmac.compare_digest(st.query_params.get("debug", "").encode(),
+                                                       DEBUG_TOKEN.encode())
 
+
+@instrumented
 def show_experiences():
     st.write("")
     st.header("What I've done professionally so far 🗓️")
@@ -62,9 +70,10 @@ def show_experiences():
     for milestone in timeline_data:
         with st.expander(f"**{milestone['year']} - *{milestone['title']}***"):
             st.markdown(milestone["description"])
-            st.image(milestone['image'], width=milestone['width'])
+            st.image(image_variant(milestone['image'], milestone['width']), width=milestone['width'])
 
 
+@instrumented
 def show_skills():
     st.write("")
     st.write("")
@@ -74,78 +83,22 @@ def show_skills():
 
     col1, col2 = st.columns(2)
 
-    # Mask for the shape of the wordcloud
-    brain_mask = np.array(Image.open("./images/brain_mask.png"))
-    brain_mask = np.where(brain_mask == 0, 255, 0).astype(np.uint8)
-
-    soft_skills = {
-        "Rigorous": 80,
-        "Detail-oriented": 65,
-        "Team player": 55,
-        "Warm": 50,
-        "Responsible": 75,
-        "Empathetic": 75,
-        "Compromise": 50,
-        "Collaboration": 50,
-        "Problem-solver": 65,
-        "Analytical thinker": 55,
-        "Fast learner": 60,
-        "Open-minded": 40,
-        "Pedagogical": 65,
-        "Patient": 60
-    }
-
-    # Creating the wordcloud of soft skills with the mask
-    soft_wordcloud = WordCloud(
-        colormap='Blues',
-        max_font_size=100,
-        min_font_size=10,
-        mask=brain_mask,
-        contour_color='white',
-        contour_width=2
-    ).generate_from_frequencies(soft_skills)
-
-    hard_skills = {
-        "Python": 80,
-        "Machine Learning": 75,
-        "Data Analysis": 65,
-        "Deep Learning": 60,
-        "NLP": 55,
-        "SQL": 75,
-        "Statistics": 65,
-        "Data Visualization": 70,
-        "Streamlit": 45,
-        "Cloud Computing": 30,
-        "Pandas": 60,
-        "Scikit-Learn": 65,
-        "GitHub": 55,
-        "Web": 50,
-        "Maths": 65
-    }
-
-    # Creating the wordcloud of hard skills with the mask
-    hard_wordcloud = WordCloud(
-        colormap='Blues',
-        max_font_size=100,
-        min_font_size=10,
-        mask=brain_mask,
-        contour_color='white',
-        contour_width=2
-    ).generate_from_frequencies(hard_skills)
+    # Creating the wordcloud of soft skills with the brain mask (laid out once, then cached)
+    soft_wordcloud = render_wordcloud(SOFT_SKILLS)
+
+    # Creating the wordcloud of hard skills with the brain mask (laid out once, then cached)
+    hard_wordcloud = render_wordcloud(HARD_SKILLS)
 
     with col1:
         st.markdown('<h3 class="main-content">Soft skills 🤝</h3>', unsafe_allow_html=True)
-        plt.imshow(soft_wordcloud)
-        plt.axis("off")
-        st.pyplot(plt)
+        st.image(soft_wordcloud, use_column_width=True)
 
     with col2:
         st.markdown('<h3 class="main-content">Hard skills 💻</h3>', unsafe_allow_html=True)
-        plt.imshow(hard_wordcloud)
-        plt.axis("off")
-        st.pyplot(plt)
+        st.image(hard_wordcloud, use_column_width=True)
 
 
+@instrumented
 def show_projects():
     st.write("")
     st.write("")
@@ -182,7 +135,7 @@ def show_projects():
         if i % 2 == 0:  # display the even projects with image on the left
             col1, col2 = st.columns([2, 5])
             with col1:
-                st.image(project['image'], use_column_width=True)
+                st.image(image_variant(project['image'], PROJECT_IMAGE_WIDTH), use_column_width=True)
             with col2:
                 st.header(project['title'])
                 st.write(project['description'])
@@ -190,7 +143,7 @@ def show_projects():
         else:  # display the odd projects with image on the right
             col1, col2 = st.columns([5, 2])
             with col2:
-                st.image(project['image'], use_column_width=True)
+                st.image(image_variant(project['image'], PROJECT_IMAGE_WIDTH), use_column_width=True)
 
             with col1:
                 st.header(project['title'])
@@ -205,7 +158,7 @@ with st.sidebar:
     placeholder_url = "https://www.linkedin.com/in/quentin-baudet/"
 
     st.title("Quentin Baudet's :blue[Dashboard] :sunglasses:")
-    st.image("./images/Photo_CV.jpg", width=150)
+    st.image(image_variant("./images/Photo_CV.jpg", 150), width=150)
     st.write("Hi ! I am a 21 years-old master's student at EFREI Paris majoring in Data & AI")
 
     st.header("Navigation")
@@ -270,5 +223,18 @@ if page == "Profile":
 
 # Navigation to the other page
 if page == "High schools Added Value":
+    # The data is loaded in the background since the first run of the app: wait for it if it is not ready yet
+    if preload.status() == "loading":
+        with st.spinner("Loading the high schools dataset..."):
+            preload.wait()
+    # Imported on first use: pandas, geopandas, folium and matplotlib are only needed by this page
+    from streamlit_pages import exploration_page
     exploration_page.show_data_exploration()
 
+
+# Once the page is drawn, the exploration page's data starts loading in the background (once per process)
+preload.start()
+
+if debug_mode:
+    from streamlit_pages import debug_panel
+    debug_panel.show_debug_panel()
@@ -0,0 +1,86 @@
+"""Build every artifact of the dashboard ahead of time, for the current version of the dataset.
+
+Usage, from the repository root (for example while building the container image):
+    python prebuild.py [path/to/dataset.csv]
+then start the app so that it only serves what was built:
+    SERVE_ONLY=1 streamlit run portfolio.py
+"""
+import json
+import os
+import sys
+import time
+from typing import Callable
+import data_handling_and_plots
+from data_handling_and_plots import *
+from department_geometry import ensure_department_geometry
+from figure_cache import artifact_path, figure_key, figure_to_bytes, render_pool, write_artifact
+from incremental_refresh import DatasetSnapshot, DatasetStore
+from skill_wordclouds import HARD_SKILLS, SOFT_SKILLS, render_wordcloud
+from streamlit_pages.exploration_page import (HONOUR_COLUMNS, MAP_COLUMNS, SCHOOL_ADDED_VALUE_COLUMNS,
+                                              SCHOOL_RATE_COLUMNS, SECTOR_COLUMNS, TREND_COLUMNS)
+
+
+def static_charts(snapshot: DatasetSnapshot) -> list[tuple[Callable, object, tuple]]:
+    """Every image the exploration page can show by default, with the same arguments as the page."""
+    distributions, cube, schools = snapshot.distributions, snapshot.cube, snapshot.schools
+    charts = []
+    for column in DISTRIBUTION_COLUMNS:
+        charts += [(create_distribution_plot, distributions, (column, int(year)))
+                   for year in distributions[column].years]
+        charts.append((create_distribution_overlay_plot, distributions, (column,)))
+    charts += [(create_trend_plot, cube, (column,)) for column in TREND_COLUMNS]
+    charts += [(create_box_plot_type, cube, (column,)) for column in SECTOR_COLUMNS]
+    charts += [(create_pie_chart_2023, cube, (columns,)) for columns in HONOUR_COLUMNS]
+
+    # Only the school selected by default, the 2300 others are rendered when someone picks them
+    if TALMA_UAI in schools.blocks:
+        charts += [(create_trends_rates_school, schools, (TALMA_UAI, SCHOOL_RATE_COLUMNS)),
+                   (create_trends_added_values_school, schools, (TALMA_UAI, SCHOOL_ADDED_VALUE_COLUMNS)),
+                   (create_trend_number_students_school, schools, (TALMA_UAI, "Presents - Toutes series"))]
+    return charts
+
+
+def build_chart(builder: Callable, data, args: tuple, data_version: str) -> str | None:
+    key = figure_key(builder, args, data_version, "png")
+    if os.path.exists(artifact_path(key, data_version, "png")):
+        return None
+    return write_artifact(key, data_version, "png", figure_to_bytes(builder(data, *args)))
+
+
+def prebuild(path: str = None) -> dict:
+    start = time.perf_counter()
+
+    # Parquet cache and year partitions, which SERVE_ONLY=1 loads without reading the CSV
+    snapshot = DatasetStore(path).refresh()
+    data_version = snapshot.version
+
+    futures = [render_pool().submit(build_chart, builder, data, args, data_version)
+               for builder, data, args in static_charts(snapshot)]
+    written = [future.result() for future in futures]
+
+    # Not versioned by the data, they land in the word cloud cache directory
+    render_wordcloud(SOFT_SKILLS)
+    render_wordcloud(HARD_SKILLS)
+
+    # Built from the local departements.geojson or the URL unless data/geometry/ is there already. Last, so that
+    # everything else is written when it fails
+    ensure_department_geometry()
+    map_key = figure_key(create_department_map, (MAP_COLUMNS,), data_version, "html")
+    if not os.path.exists(artifact_path(map_key, data_version, "html")):
+        map_html = create_department_map(snapshot.cube, MAP_COLUMNS).get_root().render()
+        written.append(write_artifact(map_key, data_version, "html", map_html.encode()))
+
+    manifest = {"data_version": data_version,
+                "source": dataset_fingerprint(path or data_handling_and_plots.DATASET_PATH),
+                "artifacts": len(futures) + 1, "written": len([path for path in written if path]),
+                "seconds": round(time.perf_counter() - start, 3)}
+    manifest_path = os.path.join(os.path.dirname(artifact_path(map_key, data_version, "html")), "manifest.json")
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    result = prebuild(*sys.argv[1:2])
+    print(f"Data version {result['data_version'][:12]}: {result['artifacts']} artifacts "
+          f"({result['written']} written) in {result['seconds']:.1f} s")
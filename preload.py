@@ -0,0 +1,59 @@
+import logging
+import threading
+from instrumentation import span
+
+# Loads the exploration page's data once per process, in the background, while visitors are on the Profile page.
+# Nothing heavy is imported here: the page module and its dependencies are imported by the worker thread.
+_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_error: Exception | None = None
+logger = logging.getLogger(__name__)
+
+
+def _preload():
+    global _error
+    try:
+        with span("preload"):
+            from streamlit_pages import exploration_page
+            exploration_page.preload_data()
+    except Exception as error:
+        # The page loads the data itself then, and shows the error if it happens again
+        logger.exception("The background preload of the exploration data failed")
+        _error = error
+
+
+def start():
+    """Start the background load, unless it was already started by this process."""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_preload, name="exploration-preload", daemon=True)
+            _thread.start()
+
+
+def status() -> str:
+    if _thread is None:
+        return "idle"
+    if _thread.is_alive():
+        return "loading"
+    return "failed" if _error is not None else "ready"
+
+
+def error() -> Exception | None:
+    return _error
+
+
+def reset():
+    """Wait for a load in flight and forget it, so that the next start() loads again (between benchmarks)."""
+    global _thread, _error
+    wait()
+    with _lock:
+        _thread, _error = None, None
+
+
+def wait(timeout: float = None) -> bool:
+    """Wait for an in-flight load rather than starting a second one; True once the data is ready."""
+    thread = _thread
+    if thread is not None:
+        thread.join(timeout)
+    return status() == "ready"
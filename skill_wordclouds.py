@@ -0,0 +1,98 @@
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+from file_utils import atomic_write, file_hash
+
+
+MASK_PATH = "./images/brain_mask.png"
+WORDCLOUD_DIR = os.path.join(os.environ.get("CACHE_DIR", ".cache"), "wordclouds")
+
+# Skills of the Profile page and their weights in the word clouds
+SOFT_SKILLS = {
+    "Rigorous": 80,
+    "Detail-oriented": 65,
+    "Team player": 55,
+    "Warm": 50,
+    "Responsible": 75,
+    "Empathetic": 75,
+    "Compromise": 50,
+    "Collaboration": 50,
+    "Problem-solver": 65,
+    "Analytical thinker": 55,
+    "Fast learner": 60,
+    "Open-minded": 40,
+    "Pedagogical": 65,
+    "Patient": 60
+}
+
+HARD_SKILLS = {
+    "Python": 80,
+    "Machine Learning": 75,
+    "Data Analysis": 65,
+    "Deep Learning": 60,
+    "NLP": 55,
+    "SQL": 75,
+    "Statistics": 65,
+    "Data Visualization": 70,
+    "Streamlit": 45,
+    "Cloud Computing": 30,
+    "Pandas": 60,
+    "Scikit-Learn": 65,
+    "GitHub": 55,
+    "Web": 50,
+    "Maths": 65
+}
+
+WORDCLOUD_OPTIONS = {
+    "colormap": "Blues",
+    "max_font_size": 100,
+    "min_font_size": 10,
+    "contour_color": "white",
+    "contour_width": 2,
+}
+
+
+@lru_cache(maxsize=None)
+def load_mask(mask_hash: str, path: str) -> np.ndarray:
+    # Mask for the shape of the wordcloud: white background, black shape
+    mask = np.array(Image.open(path))
+    return np.where(mask == 0, 255, 0).astype(np.uint8)
+
+
+def wordcloud_key(frequencies: dict[str, int], mask_hash: str) -> str:
+    description = json.dumps([sorted(frequencies.items()), mask_hash, WORDCLOUD_OPTIONS], sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+@lru_cache(maxsize=32)
+def _cached_wordcloud(key: str, frequencies: tuple, mask_hash: str, mask_path: str) -> bytes:
+    path = os.path.join(WORDCLOUD_DIR, f"{key}.png")
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    # Only imported when a layout actually has to be searched
+    from wordcloud import WordCloud
+
+    wordcloud = WordCloud(mask=load_mask(mask_hash, mask_path), **WORDCLOUD_OPTIONS)
+    wordcloud.generate_from_frequencies(dict(frequencies))
+
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format="png", optimize=True)
+    image = buffer.getvalue()
+
+    os.makedirs(WORDCLOUD_DIR, exist_ok=True)
+    with atomic_write(path) as file:
+        file.write(image)
+    return image
+
+
+def render_wordcloud(frequencies: dict[str, int], mask_path: str = MASK_PATH) -> bytes:
+    """PNG of the word cloud, laid out once per (frequencies, mask) and then read from disk or memory."""
+    mask_hash = file_hash(mask_path)
+    key = wordcloud_key(frequencies, mask_hash)
+    return _cached_wordcloud(key, tuple(sorted(frequencies.items())), mask_hash, mask_path)
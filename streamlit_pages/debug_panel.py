@@ -0,0 +1,35 @@
+import pandas as pd
+import streamlit as st
+import instrumentation
+import preload
+from figure_cache import FIGURE_CACHE
+
+
+def show_debug_panel():
+    with st.expander("Debug: timings and memory", expanded=True):
+        st.write("Spans recorded by this server process, the most recent last.")
+        if not instrumentation.ENABLED:
+            st.info("Nothing is recorded: start the server with PROFILING=1 to record spans.")
+
+        summary = instrumentation.summary()
+        if summary:
+            st.dataframe(pd.DataFrame.from_dict(summary, orient="index").sort_values("seconds", ascending=False))
+        st.write("Figure cache:", FIGURE_CACHE.stats())
+        st.write("Exploration data preload:", preload.status())
+        if preload.error() is not None:
+            st.code(repr(preload.error()))
+
+        recent = instrumentation.records()[-200:]
+        if recent:
+            st.dataframe(pd.DataFrame(recent)[["name", "seconds", "peak_bytes", "cache", "thread", "labels"]])
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button("Export as JSON lines", instrumentation.export_jsonl(), file_name="spans.jsonl",
+                               mime="application/jsonl")
+        with col2:
+            st.download_button("Export as Prometheus text", instrumentation.export_prometheus(),
+                               file_name="spans.prom", mime="text/plain")
+        with col3:
+            if st.button("Clear the records"):
+                instrumentation.clear()
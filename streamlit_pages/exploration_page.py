@@ -1,11 +1,158 @@
 import streamlit as st
 from data_handling_and_plots import *
-from streamlit_folium import st_folium
-
-
+import streamlit.components.v1 as components
+from figure_cache import figure_key, read_artifact, render_figure, render_figures
+from instrumentation import instrumented, mark_cache, span
+from chunked_ingestion import DATASET_SOURCES, sources_fingerprint, stream_aggregate_cube
+from cross_filters import FILTER_DIMENSIONS, FilterIndex
+from dataset_viewer import FILTER_COLUMNS, PAGE_SIZE, DatasetIndex
+from duckdb_backend import QUERY_BACKEND, DuckDBCube, build_duckdb_cube
+from incremental_refresh import DatasetSnapshot, DatasetStore
+from interactive_charts import (CHART_MODE, distribution_figure, pie_figure, school_figure, sector_figure,
+                                trend_figure)
+
+# Columns of the charts of each section, also used by prebuild.py to render them ahead of time
+TREND_COLUMNS = ["Presents - Toutes series", "Taux de reussite - Toutes series",
+                 "Valeur ajoutee du taux de reussite - Toutes series"]
+SECTOR_COLUMNS = ["Taux de reussite - Toutes series", "Valeur ajoutee du taux de reussite - Toutes series",
+                  "Taux de mentions - Toutes series", "Valeur ajoutee du taux de mentions - Toutes series"]
+HONOUR_COLUMNS = [[f"Nombre de mentions {honour} - {course}" for honour in
+                   ("TB avec felicitations", "TB sans felicitations", "B", "AB")] for course in ("G", "T")]
+MAP_COLUMNS = ["Valeur ajoutee du taux de reussite - Toutes series",
+               "Valeur ajoutee du taux de mentions - Toutes series"]
+SCHOOL_RATE_COLUMNS = ["Taux de reussite - Toutes series", "Taux de mentions - Toutes series"]
+SCHOOL_ADDED_VALUE_COLUMNS = ["Valeur ajoutee du taux de reussite - Toutes series",
+                              "Valeur ajoutee du taux de mentions - Toutes series"]
+
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_store() -> DatasetStore:
+    return DatasetStore()
+
+
+@st.cache_resource(show_spinner=False)
+def get_duckdb_cube(fingerprint: str) -> DuckDBCube:
+    return build_duckdb_cube()
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_dataset_index(data_version: str, _data: DataFrame) -> DatasetIndex:
+    return DatasetIndex(_data)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_filter_index(data_version: str, _snapshot: DatasetSnapshot) -> FilterIndex:
+    return FilterIndex(data_version, _snapshot.data, _snapshot.cube, _snapshot.schools, _snapshot.distributions)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_department_map_html(data_version: str, _cube: AggregateCube, column_names: tuple[str, ...]) -> str:
+    # The map is built and serialized once per version of the data (or read from the prebuilt artifacts),
+    # then the same HTML is sent to every session
+    prebuilt = read_artifact(figure_key(create_department_map, (list(column_names),), data_version, "html"),
+                             data_version, "html")
+    mark_cache(hit=prebuilt is not None)
+    if prebuilt is not None:
+        return prebuilt.decode()
+    return create_department_map(_cube, list(column_names)).get_root().render()
+
+
+def department_map_html(data_version: str, cube: AggregateCube) -> str:
+    with span("department map"):
+        # A hit when st.cache_data has the HTML, otherwise get_department_map_html marks whether it was prebuilt
+        mark_cache(hit=True)
+        return get_department_map_html(data_version, cube, tuple(MAP_COLUMNS))
+
+
+@st.cache_resource(show_spinner=False)
+def get_streamed_aggregate_cube(fingerprint: str, sources: tuple[str, ...]) -> AggregateCube:
+    return stream_aggregate_cube(list(sources))
+
+
+def show_chart(chart):
+    # Rendered images are sent as they are, Plotly figures carry their data and interactions to the browser
+    if isinstance(chart, bytes):
+        st.image(chart, use_column_width=True)
+    else:
+        st.plotly_chart(chart, use_container_width=True)
+
+
+def load_exploration_data() -> tuple[str, AggregateCube | DuckDBCube, DatasetSnapshot | None]:
+    """Data version, aggregate cube and dataset snapshot (None in streaming mode) the page is drawn from."""
+    if DATASET_SOURCES:
+        # Streaming mode: the files are too big to be loaded at once, only their aggregates are kept
+        data_version = sources_fingerprint(DATASET_SOURCES)
+        return data_version, get_streamed_aggregate_cube(data_version, tuple(DATASET_SOURCES)), None
+
+    # A new version of the dataset is merged year by year in the background, meanwhile the previous
+    # snapshot keeps being served
+    snapshot = get_dataset_store().current()
+    if QUERY_BACKEND == "duckdb":
+        # The charts' groupbys run as SQL queries on the Parquet cache instead of the pandas cube
+        return snapshot.version, get_duckdb_cube(dataset_fingerprint()), snapshot
+    return snapshot.version, snapshot.cube, snapshot
+
+
+def preload_data():
+    """Load the data and render what a first visit shows, into the same caches the page reads from."""
+    data_version, cube, snapshot = load_exploration_data()
+    if CHART_MODE != "interactive":
+        charts = ([(create_trend_plot, cube, column) for column in TREND_COLUMNS]
+                  + [(create_box_plot_type, cube, column) for column in SECTOR_COLUMNS]
+                  + [(create_pie_chart_2023, cube, columns) for columns in HONOUR_COLUMNS])
+        if snapshot is not None:
+            # The sliders start on the first year and the school case study on the Lycée Talma
+            charts += [(create_distribution_plot, snapshot.distributions, column,
+                        int(min(snapshot.distributions[column].years))) for column in DISTRIBUTION_COLUMNS]
+            if TALMA_UAI in snapshot.schools.blocks:
+                charts.append((create_trends_rates_school, snapshot.schools, TALMA_UAI, SCHOOL_RATE_COLUMNS))
+        render_figures(charts, data_version=data_version)
+
+    # Last, as it may have to build the department geometry first, and raises when that fails
+    department_map_html(data_version, cube)
+
+
+@instrumented
+def select_filters(filter_index: FilterIndex) -> dict[str, list]:
+    st.header("Filters")
+    st.write("Narrow every chart of the page down to some areas, a sector or a range of years:")
+    selection = {column: st.multiselect(column, filter_index.options(column), key=f"global_filter_{column}")
+                 for column in FILTER_DIMENSIONS}
+    years = filter_index.options('Annee')
+    first, last = st.slider("Years", int(min(years)), int(max(years)), (int(min(years)), int(max(years))),
+                            key="global_filter_years")
+    # The full range is no filter at all, so that the national charts and their cached images are used
+    if (first, last) != (min(years), max(years)):
+        selection['Annee'] = [year for year in years if first <= year <= last]
+    return selection
+
+
+@instrumented
 def show_data_exploration():
-    df: DataFrame = load_dataset()
-    df: DataFrame = data_preprocessing(df)
+    data_version, cube, snapshot = load_exploration_data()
+    chart_version, area_version = data_version, data_version
+    if snapshot is not None:
+        df: DataFrame = snapshot.data
+        schools: SchoolIndex = snapshot.schools
+        rankings: RankingTable = snapshot.rankings
+        distributions: dict[str, DistributionTable] = snapshot.distributions
+        area_cube = cube
+
+        # Every chart is drawn from the rows matching the sidebar filters, resolved with precomputed bitmaps
+        filter_index = get_filter_index(data_version, snapshot)
+        with st.sidebar:
+            selection = select_filters(filter_index)
+        if any(selection.values()):
+            view = filter_index.view(selection)
+            cube, distributions, schools, chart_version = view.cube, view.distributions, view.schools, view.version
+            # The 2023 case study keeps the areas and the sector but not the range of years
+            area_view = filter_index.view({**selection, 'Annee': []})
+            area_cube, area_version = area_view.cube, area_view.version
+            if view.rows == 0:
+                st.warning("No high school matches these filters.")
+                return
+    else:
+        area_cube = cube
     st.markdown('''<h1 class="main-content"> Added value of <span style='color:#38b3fc;'>French High schools</span>! 🏫</h1>''',
                 unsafe_allow_html=True)
     st.write("")
@@ -20,20 +167,29 @@ def show_data_exploration():
     """, unsafe_allow_html=True)
     st.write("")
 
-    # Section 1: Analysis of the raw data
-    show_dataset(df)
+    # Each section is a fragment: its widgets only rerun the section itself, not the whole page
+    if DATASET_SOURCES:
+        st.info("The data is read from several files in streaming mode, so only the sections built on yearly and "
+                "departmental averages are shown.")
+    else:
+        # Section 1: Analysis of the raw data
+        show_dataset(df, data_version)
 
-    # Section 2: Exploration of distributions
-    show_distributions(df)
+        # Section 2: Exploration of distributions
+        show_distributions(distributions, chart_version)
 
     # Section 3: Analysis of the tendencies
-    show_tendencies(df)
+    show_tendencies(cube, chart_version)
 
     # Section 4: Case study for 2023
-    show_case_study_2023(df)
+    if area_version == data_version or 2023 in area_cube.table.index.get_level_values('Annee'):
+        show_case_study_2023(area_cube, area_version)
+    else:
+        st.info("The high schools matching these filters have no results in 2023.")
 
     # Section 5: Case study for my high school: Talma
-    show_case_study_talma(df)
+    if not DATASET_SOURCES:
+        show_case_study_talma(schools, rankings, chart_version)
 
     st.markdown(
         '''<h1 class="main-content"> <span style='color:#38b3fc;'>Conclusion</span>! 🏫</h1>''',
@@ -48,34 +204,79 @@ def show_data_exploration():
         """, unsafe_allow_html=True)
 
 
-def show_dataset(df: DataFrame):
+@st.fragment
+@instrumented
+def show_dataset(df: DataFrame, data_version: str):
     st.header("Let's start exploring the dataset! 📈")
     st.write("")
     st.write("")
     st.write("Here is what it looks like:")
-    st.dataframe(df)
+
+    # The rows stay on the server: filters, search and sorting select row positions and only one page is sent
+    dataset_index = get_dataset_index(data_version, df)
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        search = st.text_input("Search a high school, town or UAI:", key="dataset_search")
+    with col2:
+        sort_by = st.selectbox("Sort by:", [None] + list(df.columns), key="dataset_sort",
+                               format_func=lambda column: "Dataset order" if column is None else column)
+    with col3:
+        descending = st.toggle("Descending", key="dataset_descending")
+
+    filters = {}
+    for column, filter_column in zip(FILTER_COLUMNS, st.columns(len(FILTER_COLUMNS))):
+        with filter_column:
+            filters[column] = st.multiselect(column, dataset_index.options(column), key=f"dataset_filter_{column}")
+
+    rows = dataset_index.query(filters, search.strip(), sort_by, ascending=not descending)
+    page_count = max(1, -(-len(rows) // PAGE_SIZE))
+    # A new number of matching rows starts again from the first page
+    page = st.number_input(f"Page (out of {page_count}):", min_value=1, max_value=page_count, value=1,
+                           key=f"dataset_page_{len(rows)}")
+    st.dataframe(dataset_index.page(rows, page), hide_index=True)
+    first_row = min((page - 1) * PAGE_SIZE + 1, len(rows))
+    st.caption(f"Rows {first_row} to {min(page * PAGE_SIZE, len(rows))} of {len(rows)} matching rows "
+               f"({len(df)} in the dataset)")
     st.write("")
     st.write("We have a few crucial information in this dataset. Each high school has the information needed to recognize it : its name, location but also a UAI number which is a unique identifier.")
     st.write("There is data present from the year 2013 to 2023 and for each year each high school has important data like success rate, added value, mention rate, and the differences between course of studies.")
     st.write("")
 
 
-def show_distributions(df: DataFrame):
+def distribution_chart(distributions: dict[str, DistributionTable], column_to_study: str, key: int,
+                       data_version: str):
+    if CHART_MODE == "interactive":
+        # Every year is in the chart, the year slider and the overlay button run in the browser
+        return distribution_figure(distributions[column_to_study])
+
+    # Slider to select the years, every year's histogram is already computed
+    years = distributions[column_to_study].years
+    if len(years) < 2:
+        # Filtered down to a single year (or none), there is nothing to pick
+        return render_figure(create_distribution_plot, distributions, column_to_study,
+                             int(years[0]) if len(years) else 0, data_version=data_version)
+    selected_year = st.slider('Select the year', int(min(years)), int(max(years)), int(min(years)), key=key)
+    if st.checkbox('Overlay all the years', key=f'overlay_{key}'):
+        return render_figure(create_distribution_overlay_plot, distributions, column_to_study,
+                             data_version=data_version)
+    return render_figure(create_distribution_plot, distributions, column_to_study, selected_year,
+                         data_version=data_version)
+
+
+@st.fragment
+@instrumented
+def show_distributions(distributions: dict[str, DistributionTable], data_version: str):
     st.header("Analysis of the different distributions:")
     st.write("")
 
     # First distribution plot
     st.subheader("Distribution of the baccalaureate success rate depending on the years:")
 
-    # Slider to select the years
-    years = df['Annee'].unique()
-    selected_year = st.slider('Select the year', int(min(years)), int(max(years)), int(min(years)), key=1)
-    columns_to_study = ['Annee', 'Taux de reussite - Toutes series']
-    distribution_plot = create_distribution_plot(df, columns_to_study, selected_year)
+    distribution_plot = distribution_chart(distributions, 'Taux de reussite - Toutes series', 1, data_version)
 
     col1, col2 = st.columns([2, 1])  # Define two columns with different widths
     with col1:
-        st.pyplot(distribution_plot)
+        show_chart(distribution_plot)
     with col2:
         st.write(
             "From what we can see, it seems that the baccalaureate success rates have increased with the years, we observe more and more high schools with success rates > 97%.")
@@ -88,15 +289,11 @@ def show_distributions(df: DataFrame):
     st.write("")
     st.subheader("Distribution of the added value on the success rate of the baccalaureate depending on the years:")
 
-    # Slider to select the years
-    years = df['Annee'].unique()
-    selected_year = st.slider('Select the year', int(min(years)), int(max(years)), int(min(years)), key=2)
-    columns_to_study = ['Annee', 'Valeur ajoutee du taux de reussite - Toutes series']
-    distribution_plot = create_distribution_plot(df, columns_to_study, selected_year)
+    distribution_plot = distribution_chart(distributions, 'Valeur ajoutee du taux de reussite - Toutes series', 2, data_version)
 
     col1, col2 = st.columns([2, 1])  # Define two columns with different widths
     with col1:
-        st.pyplot(distribution_plot)
+        show_chart(distribution_plot)
     with col2:
         st.write(
             "Concerning the added value that high schools have brought to the success rate of their students, we can see that their distributions follows a normal distribution, which was to be expected since there are some that bring a lot of values but others that are less impactful.")
@@ -105,28 +302,37 @@ def show_distributions(df: DataFrame):
     st.write("")
 
 
-def show_tendencies(df: DataFrame):
+@st.fragment
+@instrumented
+def show_tendencies(cube: AggregateCube, data_version: str):
     st.header("Analysis of the tendencies over the years:")
     st.write("")
 
+    # The seven charts of this section are rendered together on the render pool
+    if CHART_MODE == "interactive":
+        trend_plots = [trend_figure(cube, column) for column in TREND_COLUMNS]
+        box_plots = [sector_figure(cube, column) for column in SECTOR_COLUMNS]
+    else:
+        images = render_figures([(create_trend_plot, cube, column) for column in TREND_COLUMNS]
+                                + [(create_box_plot_type, cube, column) for column in SECTOR_COLUMNS],
+                                data_version=data_version)
+        trend_plots, box_plots = images[:3], images[3:]
+
     st.subheader("Trends in the number of students, average success rate and average added value on the success rate:")
     col1, col2, col3 = st.columns([1, 1, 1])
     with col1:
         st.write("Average number of students:")
-        trend_plot = create_trend_plot(df, "Presents - Toutes series")
-        st.pyplot(trend_plot)
+        show_chart(trend_plots[0])
         st.write(
             "We can see that the number of students has risen significantly starting from 2018, which indicates that the high schools are getting fuller and fuller.")
     with col2:
         st.write("Average success rate for the final exam:")
-        trend_plot = create_trend_plot(df, "Taux de reussite - Toutes series")
-        st.pyplot(trend_plot)
+        show_chart(trend_plots[1])
         st.write(
             "We can see that the success rate used to be fixed at around 92%, but since 2020 it has shot up to be closer to 98%. This jump coincides with the Covid-19 which lead to the suppression of the exams, replaced by continuous grades. The two years where this was in place were the most successful.")
     with col3:
         st.write("Average added value on the success rate for high schools:")
-        trend_plot = create_trend_plot(df, "Valeur ajoutee du taux de reussite - Toutes series")
-        st.pyplot(trend_plot)
+        show_chart(trend_plots[2])
         st.write(
             "There doesn't really seem to be a trend in this data, it is difficult to interpret directly the added value without the details of the social conditions.")
 
@@ -139,29 +345,25 @@ def show_tendencies(df: DataFrame):
 
     with tab1:
         st.write("Success rate tendencies for the public and private field over the years:")
-        box_plot = create_box_plot_type(df, "Taux de reussite - Toutes series")
-        st.pyplot(box_plot)
+        show_chart(box_plots[0])
         st.write(
             "From this, we can see that no matter the year, the average success rate at the baccalaureate exam is always higher for the private sector than the public.")
 
     with tab2:
         st.write("Added value to success rate tendencies for the public and private field over the years:")
-        box_plot = create_box_plot_type(df, "Valeur ajoutee du taux de reussite - Toutes series")
-        st.pyplot(box_plot)
+        show_chart(box_plots[1])
         st.write(
             "From this graph, we can see a very clear pattern: the public high school's added value for the success rate is always negative, while the ones for the private sector are always positive. This means that the private sector manages to provide greater education which leads to better results than what is expected based on the profiles of their students.")
 
     with tab3:
         st.write("Honour rate tendencies for the public and private field over the years:")
-        box_plot = create_box_plot_type(df, "Taux de mentions - Toutes series")
-        st.pyplot(box_plot)
+        show_chart(box_plots[2])
         st.write(
             "We can see that the honour rate has started to be put in the dataset starting from 2017. As for the trends, we can see that the private schools always end up having a higher honour rate than the public ones. They always lead by around 10% honour rate.")
 
     with tab4:
         st.write("Added value to the honour rate for the public and private field over the years:")
-        box_plot = create_box_plot_type(df, "Valeur ajoutee du taux de mentions - Toutes series")
-        st.pyplot(box_plot)
+        show_chart(box_plots[3])
         st.write(
             "Even when taking into consideration the social factors and profile of the students, the private sector still leads, always bringing positive added value on the honour rate. On the contrary, the public sector is not doing great by not gathering as many honours as it should considering the context.")
 
@@ -172,25 +374,26 @@ def show_tendencies(df: DataFrame):
     st.write("")
 
 
-def show_case_study_2023(df: DataFrame):
+@st.fragment
+@instrumented
+def show_case_study_2023(cube: AggregateCube, data_version: str):
     st.header("Case study for the year 2023:")
     st.write("")
 
     st.subheader("Pie charts on the proportion of honours in the general and technological fields of study:")
+    if CHART_MODE == "interactive":
+        general_pie, technological_pie = [pie_figure(cube, columns) for columns in HONOUR_COLUMNS]
+    else:
+        general_pie, technological_pie = render_figures([(create_pie_chart_2023, cube, columns)
+                                                         for columns in HONOUR_COLUMNS], data_version=data_version)
     col1, col2 = st.columns([1, 1])
     with col1:
         st.write("Trends for the honours for the general course of studies:")
-        trends_plot = create_pie_chart_2023(df, ["Nombre de mentions TB avec felicitations - G",
-                                                 "Nombre de mentions TB sans felicitations - G",
-                                                 "Nombre de mentions B - G", "Nombre de mentions AB - G"])
-        st.pyplot(trends_plot)
+        show_chart(general_pie)
 
     with col2:
         st.write("Trends for the honours for the technological course of studies:")
-        trends_plot = create_pie_chart_2023(df, ["Nombre de mentions TB avec felicitations - T",
-                                                 "Nombre de mentions TB sans felicitations - T",
-                                                 "Nombre de mentions B - T", "Nombre de mentions AB - T"])
-        st.pyplot(trends_plot)
+        show_chart(technological_pie)
 
     st.write(
         "We can see from those two pie charts that the most common honour is 'Assez bien'. The general course of studies has a greater proportion of TB and B honours, while 63% of hounours in the technological field are AB.")
@@ -198,18 +401,21 @@ def show_case_study_2023(df: DataFrame):
 
     st.write("")
     st.subheader("Added value on of the french departments in 2023:")
+    st.write("French map of the added value on the success rate and on the honour rate (pick the metric at the top right):")
+    try:
+        map_html = department_map_html(data_version, cube)
+    except FileNotFoundError as error:
+        # The department outlines were not shipped and could not be built, the rest of the page works without them
+        st.error(str(error))
+    else:
+        components.html(map_html, height=600)
+
     col1, col2 = st.columns([1, 1])
     with col1:
-        st.write("French map of the added value on the success rate:")
-        map_1 = create_department_success_rate_map(df, "Valeur ajoutee du taux de reussite - Toutes series")
-        st_data_1 = st_folium(map_1, height=600)
         st.write(
             "From what we can see in this map, there isn't truly any department which is the best or the worst. All of the averages of the added values per departement are pretty similar. The one with the highest average is 'Hauts de Corse', while the lowest is the 'Haute-Saône'")
 
     with col2:
-        st.write("French map of the added value on the honour rate:")
-        map_2 = create_department_success_rate_map(df, "Valeur ajoutee du taux de mentions - Toutes series")
-        st_data_2 = st_folium(map_2, height=600)
         st.write(
             "In this map, the differences between departments are a bit more striking. Once again, the 'Haute-Corse' is brings the highest added value, and we can notice that the departments in the very north, east and south tend to do better than the central ones. The departement which brings the lowest average of added value on the honours is the 'Cantal'.")
 
@@ -220,36 +426,76 @@ def show_case_study_2023(df: DataFrame):
     st.write("")
 
 
-def show_case_study_talma(df: DataFrame):
-    st.header("Case study on my personal high school : Lycée Talma:")
+@st.fragment
+@instrumented
+def show_case_study_talma(schools: SchoolIndex, rankings: RankingTable, data_version: str):
+    # Filled once the school is picked, as it names the school
+    header = st.empty()
     st.write("")
 
-    col1, col2 = st.columns([1, 3])
+    # Any other high school can be picked, the search runs on the names, towns and UAI numbers
+    school_options = sorted(schools.blocks, key=schools.label)
+    uai = st.selectbox("Search for a high school:", school_options,
+                       index=school_options.index(TALMA_UAI) if TALMA_UAI in schools.blocks else 0,
+                       format_func=schools.label)
+    if uai == TALMA_UAI:
+        header.header("Case study on my personal high school : Lycée Talma:")
+    else:
+        header.header(f"Case study on a high school : {schools.name(uai)}:")
+
+    if CHART_MODE == "interactive":
+        # The rates, added values and number of students are buttons of a single chart
+        show_chart(school_figure(schools, uai))
+    else:
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            option = st.radio("Select which plot to display:",
+                              ("Rates", "Added Values", "Number of students")
+                              )
+
+        with col2:
+            if option == "Rates":
+                st.write("Trends on the rates of success and honours:")
+                trend_plot_school = render_figure(create_trends_rates_school, schools, uai, SCHOOL_RATE_COLUMNS,
+                                                  data_version=data_version)
+                st.image(trend_plot_school, use_column_width=True)
+
+            elif option == "Added Values":
+                st.write("Trends on the added values on success and honours:")
+                trend_plot_school = render_figure(create_trends_added_values_school, schools, uai,
+                                                  SCHOOL_ADDED_VALUE_COLUMNS, data_version=data_version)
+                st.image(trend_plot_school, use_column_width=True)
+
+            elif option == "Number of students":
+                st.write("Trend on the number of students over the years")
+                trend_plot_school = render_figure(create_trend_number_students_school, schools, uai,
+                                                  "Presents - Toutes series", data_version=data_version)
+                st.image(trend_plot_school, use_column_width=True)
+
+    st.subheader("Ranking within its area:")
+    # Every school is ranked once per version of the data, picking a year, area or metric is only a lookup
+    years = sorted(schools.rows(uai)['Annee'].unique().tolist(), reverse=True)
+    col1, col2, col3 = st.columns([1, 1, 2])
     with col1:
-        option = st.radio("Select which plot to display:",
-                          ("Rates", "Added Values", "Number of students")
-                          )
-
+        year = st.selectbox("Year:", years)
     with col2:
-        if option == "Rates":
-            st.write("Trends on the rates of success and honours:")
-            trend_plot_talma = create_trends_rates_talma(df, ["Taux de reussite - Toutes series",
-                                                              "Taux de mentions - Toutes series"])
-            st.pyplot(trend_plot_talma)
-
-        elif option == "Added Values":
-            st.write("Trends on the added values on success and honours:")
-            trend_plot_talma = create_trends_added_values_talma(df,
-                                                                ["Valeur ajoutee du taux de reussite - Toutes series",
-                                                                 "Valeur ajoutee du taux de mentions - Toutes series"])
-            st.pyplot(trend_plot_talma)
+        scope = st.selectbox("Compared with the schools of its:", RANKING_SCOPES)
+    with col3:
+        metric = st.selectbox("Top 10 on:", METRIC_COLUMNS,
+                              index=METRIC_COLUMNS.index("Valeur ajoutee du taux de reussite - Toutes series"))
 
-        elif option == "Number of students":
-            st.write("Trend on the number of students over the years")
-            trend_plot_talma = create_trend_number_students_talma(df, "Presents - Toutes series")
-            st.pyplot(trend_plot_talma)
+    school_rows = schools.rows(uai)
+    area = school_rows.loc[school_rows['Annee'] == year, scope].iat[0]
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.write(f"Rank of the school among the schools of {scope.lower()} {area} in {year}:")
+        st.dataframe(rankings.school(schools, uai, year, scope), use_container_width=True)
+    with col2:
+        st.write(f"Best schools of {scope.lower()} {area} in {year}:")
+        st.dataframe(rankings.top(scope, area, year, metric), hide_index=True, use_container_width=True)
 
+    if uai == TALMA_UAI:
+        st.write("")
+        st.write(
+            "From what we can see, my high school's results were influenced a lot by the Covid-19. Better success rates, more honours and added values, they got good results because of it. We can see that before that time the school didn't have great results with negative added values. Since the Covid however the results seem to slowly go back down, which is a bad sign, especially since the number of students is rising.")
     st.write("")
-    st.write(
-        "From what we can see, my high school's results were influenced a lot by the Covid-19. Better success rates, more honours and added values, they got good results because of it. We can see that before that time the school didn't have great results with negative added values. Since the Covid however the results seem to slowly go back down, which is a bad sign, especially since the number of students is rising.")
-    st.write("")
\ No newline at end of file